@@ -7,6 +7,17 @@ from pygame import Vector2
 # Directories
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 ANGLES_FILE_PATH = os.path.join(THIS_DIR, "..", "..", "..", "data/output.motctl")
+CONTOUR_CACHE_DIR = os.path.join(
+    THIS_DIR, "..", "..", "..", "data/contour_cache"
+)
+
+# Extracted contours cache size limit (bytes)
+CONTOUR_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Downloaded images are decoded at a reduced scale, down to this size (px)
+# on their longest side, and never take more memory than the budget (bytes)
+IMAGE_DECODE_MIN_SIDE = 1024
+IMAGE_MEMORY_BUDGET = 32 * 1024 * 1024
 
 # Robotic arm configuration
 
@@ -17,8 +28,35 @@ BASE_HEIGHT = 170
 PEN_ARM_LEN = 120       # Horizontal pen offset
 PEN_LEN = 100           # Vertical pen offset
 PEN_UP_DISTANCE = 50    # How high above paper when pen is up
+PEN_WIDTH = 0.5         # Width of the line the pen draws
+
+# Motor max speeds (steps/s) for X, Y, Z and A and their acceleration
+# (steps/s^2), as set in motor_controller.ino
+MOTOR_MAX_SPEEDS = (80, 150, 80, 250)
+MOTOR_ACCELERATION = 3000
+
+# The firmware's serial baud rate, and about how many characters it echoes
+# back for every move command
+FIRMWARE_BAUD_RATE = 9600
+FIRMWARE_ECHO_CHARS = 63
+
+# "canny" draws the outlines of shapes, "skeleton" draws line art strokes
+# once along their centerlines
+EXTRACTION_MODE = "canny"
 
 # The value to change the detail level by when too high/low
 DETAIL_LEVEL_ADAPT = 0.05
 CONTOURS_COUNT_MAX = 50
 CONTOURS_COUNT_MIN = 15
+
+# Target drawing time (seconds) to refine the detail level to instead of the
+# contour count bounds (None to use the bounds), and how far under it a
+# drawing may be
+DRAWING_TIME_TARGET = None
+DRAWING_TIME_TOLERANCE = 0.1
+
+# Seconds spent improving the contour drawing order before a job is sent
+ORDER_REFINE_TIME_BUDGET = 2.0
+
+# Hops between contours shorter than this (mm) are drawn with the pen down
+PEN_LIFT_THRESHOLD = 1.0
@@ -2,7 +2,8 @@
 Inverse kinematics mathematics for a 2-DOF robotic arm.
 
 Contains a function to show the graphed visualisation of the arm given
-a desired target point.
+a desired target point, and batch versions of the angle and step functions
+over NumPy arrays of points.
 
 Sources: https://github.com/vishwas1101/Inverse-Kinematic-Robot-Arm/blob/
         master/InverseKinematics/IK_Simulation.py
@@ -10,6 +11,13 @@ Sources: https://github.com/vishwas1101/Inverse-Kinematic-Robot-Arm/blob/
 
 import math
 import matplotlib.pyplot as plt
+import numpy as np
+
+
+# Batch results closer than this to a rounding or reach boundary are
+# recomputed with the scalar functions, so the batch functions give the
+# same results whatever the last bits of NumPy's trigonometry are
+BATCH_EXACT_TOLERANCE = 1e-6
 
 
 #  pylint: disable=too-many-locals
@@ -172,3 +180,99 @@ def steps_to_deg(
     deg_per_step = 360.0 / steps_per_rev
     return steps * deg_per_step / gear_ratio
 
+
+def get_ik_angles_batch(points, base, arm1, arm2):
+    """Vectorized get_ik_angles over an (N, 3) array of (x, y, z) points.
+    Returns an (N, 3) array of the base angle, angle of arm 1 and angle of
+    arm 2, NaN where the point can't be reached (or the scalar function
+    would fail), and a mask of the points that can be reached."""
+    x, y, z = np.asarray(points, dtype=float).reshape(-1, 3).T
+    d = np.sqrt(x**2 + y**2 + (z - base) ** 2)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        alpha = np.degrees(np.arctan2(y, x))
+        theta1 = np.arcsin((z - base) / d)
+        theta2 = np.arccos((arm1**2 + d**2 - arm2**2) / (2 * arm1 * d))
+        beta = np.degrees(theta1 + theta2)
+        gamma = np.degrees(
+            np.arccos((arm1**2 + arm2**2 - d**2) / (2 * arm1 * arm2))
+        )
+
+    angles = np.column_stack((alpha, beta, gamma))
+    reachable = (d <= arm1 + arm2) & ~np.isnan(angles).any(axis=1)
+    angles[~reachable] = np.nan
+    return angles, reachable
+
+
+def get_real_angles_batch(points, base, arm1, arm2, decimals=2):
+    """Vectorized get_real_angles over an (N, 3) array of (x, y, z) points.
+    Returns an (N, 4) array of the X, Y, Z and A motor angles, NaN where
+    the point can't be reached, and a mask of the points that can be. The
+    angles are the same as get_real_angles gives."""
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    ik_angles, reachable = get_ik_angles_batch(points, base, arm1, arm2)
+    ang_base, ang_arm1, ang_arm2 = ik_angles.T
+
+    # Minor corrections to y because IDFK
+    y = ang_base - 180
+    y = np.where(y <= -180, -(y + 360), y)
+
+    angles = np.column_stack((
+        ang_arm2 - 180,
+        y,
+        -ang_arm1 + 90,
+        ang_arm2 + ang_arm1 - 270,
+    ))
+    scaled = angles * 10.0 ** decimals
+    rounded = np.rint(scaled)
+
+    # Redo the points near a boundary where the last bits could change the
+    # result one at a time, including Python's correctly rounded round()
+    d = np.sqrt(
+        points[:, 0] ** 2 + points[:, 1] ** 2 + (points[:, 2] - base) ** 2
+    )
+    tolerance = BATCH_EXACT_TOLERANCE
+    near_boundary = (
+        (np.abs(d - (arm1 + arm2)) < tolerance)
+        | (np.abs(ang_base) < tolerance)
+        | np.any(
+            np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < tolerance,
+            axis=1
+        )
+    )
+    angles = rounded / 10.0 ** decimals
+    angles[~reachable] = np.nan
+    for i in np.flatnonzero(near_boundary):
+        try:
+            real_angles = get_real_angles(
+                *points[i].tolist(), base, arm1, arm2, decimals
+            )
+        except (ValueError, ZeroDivisionError):
+            real_angles = None  # Out of the scalar functions' domain
+        reachable[i] = real_angles is not None
+        angles[i] = (
+            [real_angles[motor] for motor in "xyza"] if real_angles
+            else np.nan
+        )
+    return angles, reachable
+
+
+def deg_to_steps_batch(
+        angles,
+        steps_per_rev: float = 200,
+        gear_ratio: float = 256.0 / 9.0):
+    """Vectorized deg_to_steps over an array of angles, returned as an
+    int32 array of the same shape. NaN angles become 0 steps."""
+    deg_per_step = 360.0 / steps_per_rev
+    steps = np.rint((np.asarray(angles, dtype=float) / deg_per_step)
+                    * gear_ratio)
+    return np.nan_to_num(steps).astype(np.int32)
+
+
+def get_steps_batch(points, base, arm1, arm2):
+    """Motor steps of an (N, 3) array of (x, y, z) points, as an (N, 4)
+    int32 array of X, Y, Z and A steps (0 where the point can't be
+    reached), and a mask of the points that can be reached. Each row is
+    the same as deg_to_steps of get_real_angles for that point."""
+    angles, reachable = get_real_angles_batch(points, base, arm1, arm2)
+    return deg_to_steps_batch(angles), reachable
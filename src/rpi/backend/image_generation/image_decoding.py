@@ -0,0 +1,78 @@
+"""
+Decodes downloaded images within the Raspberry Pi's memory budget.
+"""
+
+import io
+
+import numpy as np
+import cv2
+
+from cv2.typing import MatLike
+from PIL import Image
+from src.rpi.backend.constants import (
+    IMAGE_DECODE_MIN_SIDE,
+    IMAGE_MEMORY_BUDGET,
+)
+
+
+# OpenCV flags to decode colour images at 1/1, 1/2, 1/4 and 1/8 scale
+_REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def decode_image(
+        content: bytes,
+        min_side: int = IMAGE_DECODE_MIN_SIDE,
+        memory_budget: int = IMAGE_MEMORY_BUDGET) -> MatLike | None:
+    """
+    Decodes an encoded image to an OpenCV image at the smallest of 1/1,
+    1/2, 1/4 or 1/8 scale that keeps its longest side at least min_side.
+    Only the header is read to find the size and format.
+
+    JPEGs are decoded straight at that scale, which is reduced further if
+    the decoded image would be larger than memory_budget bytes, so large
+    JPEGs are never decoded at full size. Other formats (e.g. PNG) can only
+    be decoded at full size and are then shrunk, so the full size image
+    must fit in the budget. Returns None if the image doesn't fit.
+    """
+    with Image.open(io.BytesIO(content)) as header:
+        width, height = header.size
+        is_jpeg = header.format == "JPEG"
+
+    def decoded_bytes(reduction: int) -> int:
+        return -(-width // reduction) * -(-height // reduction) * 3
+
+    reduction = 1
+    while reduction < 8 and max(width, height) // (reduction * 2) >= min_side:
+        reduction *= 2
+    while reduction < 8 and decoded_bytes(reduction) > memory_budget:
+        reduction *= 2
+    if decoded_bytes(reduction) > memory_budget:
+        print(f"Image of {width}x{height} does not fit in the memory budget "
+              f"of {memory_budget} bytes.")
+        return None
+
+    if not is_jpeg and decoded_bytes(1) > memory_budget:
+        print(f"Image of {width}x{height} does not fit in the memory budget "
+              f"of {memory_budget} bytes (only JPEGs can be decoded below "
+              "full size).")
+        return None
+
+    if reduction > 1:
+        print(f"Decoding {width}x{height} image at 1/{reduction} scale")
+    image_bytes = np.frombuffer(content, np.uint8)
+    if is_jpeg:
+        return cv2.imdecode(image_bytes, _REDUCED_DECODE_FLAGS[reduction])
+
+    image = cv2.imdecode(image_bytes, cv2.IMREAD_COLOR)
+    if image is None or reduction == 1:
+        return image
+    return cv2.resize(
+        image,
+        (-(-width // reduction), -(-height // reduction)),
+        interpolation=cv2.INTER_AREA
+    )
@@ -1,10 +1,9 @@
 #!/usr/bin/env python3
 
 import requests
-import numpy as np
-import cv2
 
 from cv2.typing import MatLike
+from src.rpi.backend.image_generation.image_decoding import decode_image
 from src.rpi.backend.image_generation.bingart import BingArt, AuthCookieError
 from src.rpi.backend.image_generation.bing_token_retriever import (
     get_token,
@@ -69,8 +68,9 @@ def _extract_image(image_url) -> MatLike | None:
 
     # Try to open the image and return OpenCV image
     try:
-        image_bytes = np.frombuffer(response.content, np.uint8)
-        cv_image = cv2.imdecode(image_bytes, cv2.IMREAD_COLOR)
+        cv_image = decode_image(response.content)
+        if cv_image is None:
+            return None
         print("Successfully retreived image data.")
         return cv_image
     except (IOError, ValueError) as img_err:
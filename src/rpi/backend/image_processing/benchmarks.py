@@ -0,0 +1,635 @@
+"""
+Benchmarks for the image processing pipeline.
+
+Run from the repository root, optionally naming the benchmarks to run:
+    python -m src.rpi.backend.image_processing.benchmarks [name ...]
+"""
+
+import glob
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from src.rpi.backend.image_generation.image_decoding import decode_image
+from src.rpi.backend.image_processing import image_processing as img_proc
+from src.rpi.backend.image_processing.contour_set import ContourSet
+from src.rpi.backend.image_processing.contour_ordering import (
+    pen_up_travel,
+    refine_contour_order,
+)
+from src.rpi.backend.image_processing.overdraw import remove_overdraw
+from src.rpi.backend.image_processing.parameter_sweep import SWEEP_OFFSET
+from src.rpi.backend.image_processing.stroke_stitching import stitch_contours
+from src.rpi.backend.ik.ik import (
+    deg_to_steps,
+    get_real_angles,
+    get_steps_batch,
+)
+from src.rpi.backend.constants import (
+    ARM_LEN_1,
+    ARM_LEN_2,
+    BASE_HEIGHT,
+    DETAIL_LEVEL_ADAPT,
+    CONTOURS_COUNT_MIN,
+    CONTOURS_COUNT_MAX,
+    PEN_UP_DISTANCE,
+)
+
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(THIS_DIR, "..", "..", "..", "..", "images")
+
+
+def _load_sample_images() -> dict:
+    # Loads the bundled sample images keyed by file name.
+    paths = sorted(
+        glob.glob(os.path.join(IMAGES_DIR, "*.jpg"))
+        + glob.glob(os.path.join(IMAGES_DIR, "*.png"))
+    )
+    return {os.path.basename(path): cv2.imread(path) for path in paths}
+
+
+def _raw_contours(cv_image, new_dimensions):
+    # Extracts unsmoothed contours the same way as extract_contours.
+    return img_proc.ExtractionPipeline(cv_image).raw_contours(new_dimensions)
+
+
+def _best_time(func, repeats: int = 3) -> float:
+    # Returns the best wall time of a few runs in seconds.
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_parallel_smoothing(
+        worker_counts=(1, 2, 3, 4),
+        new_dimensions=(800, 800)) -> None:
+    """Times _get_smoothed_contours on the sample images for each worker
+    count and prints the speedup relative to a single worker. The serial
+    fallback threshold is disabled so every worker count is measured."""
+    img_proc.PARALLEL_SMOOTHING_MIN_POINTS = 0
+    for name, cv_image in _load_sample_images().items():
+        contours = _raw_contours(cv_image, new_dimensions)
+        point_count = sum(len(contour) for contour in contours)
+        print(f"{name}: {len(contours)} contours, {point_count} points")
+
+        serial_time = None
+        for workers in worker_counts:
+            def smooth(workers=workers):
+                img_proc._get_smoothed_contours(  # pylint: disable=protected-access
+                    contours, 2, 30, (0.05, 0.95), 0.5, 90, workers=workers
+                )
+            smooth()  # Warm up the worker pool
+            elapsed = _best_time(smooth)
+            if serial_time is None:
+                serial_time = elapsed
+            print(f"\t{workers} worker(s): {elapsed * 1000:8.1f} ms "
+                  f"({serial_time / elapsed:.2f}x)")
+
+
+def _legacy_refine_contour_count(
+        cv_image,
+        detail_level_adaptation_step: float,
+        min_contour_count: int,
+        max_contour_count: int,
+        new_dimensions) -> int:
+    # The fixed step refinement loop that the bracketed search replaced.
+    # Returns the number of extractions it ran.
+    detail_level = img_proc.calculate_image_detail_level(cv_image, 100, 400)
+    extractions = 0
+    for _ in range(10):
+        contours = img_proc.extract_contours(
+            cv_image,
+            new_dimensions=new_dimensions,
+            initial_detail_level=detail_level
+        )
+        extractions += 1
+        new_detail_level = detail_level
+        if len(contours) > max_contour_count:
+            new_detail_level -= detail_level_adaptation_step
+        elif len(contours) < min_contour_count:
+            new_detail_level += detail_level_adaptation_step
+        if new_detail_level == detail_level or not 0 <= new_detail_level >= 1:
+            break
+        detail_level = new_detail_level
+    return extractions
+
+
+def bench_refinement(
+        search_workers=(1, 4),
+        new_dimensions=(210, 210)) -> None:
+    """Compares the extraction count and wall time of the fixed step
+    refinement loop against the bracketed detail level search."""
+    for name, cv_image in _load_sample_images().items():
+        print(f"{name}:")
+        start = time.perf_counter()
+        extractions = _legacy_refine_contour_count(
+            cv_image, DETAIL_LEVEL_ADAPT,
+            CONTOURS_COUNT_MIN, CONTOURS_COUNT_MAX, new_dimensions
+        )
+        elapsed = time.perf_counter() - start
+        print(f"\tfixed step:         {extractions:2d} extraction(s), "
+              f"{elapsed * 1000:8.1f} ms")
+
+        for workers in search_workers:
+            contours, report = img_proc.extract_and_refine_contour_count(
+                cv_image, DETAIL_LEVEL_ADAPT,
+                CONTOURS_COUNT_MIN, CONTOURS_COUNT_MAX, new_dimensions,
+                search_workers=workers, return_report=True
+            )
+            print(f"\tbracketed ({workers} thr): "
+                  f"{report['extractions']:2d} extraction(s), "
+                  f"{report['wall_time'] * 1000:8.1f} ms, "
+                  f"{len(contours)} contours")
+
+
+def _synthetic_contours(count: int, seed: int = 0, size: float = 210.0):
+    # Random short open strokes and small closed loops spread over a sheet.
+    rng = np.random.default_rng(seed)
+    contours = []
+    for i in range(count):
+        origin = rng.uniform(0, size, 2)
+        if i % 4 == 0:
+            angles = np.linspace(0, 2 * np.pi, 12, endpoint=False)
+            radius = rng.uniform(0.5, 3)
+            contours.append(
+                origin + radius * np.column_stack((np.cos(angles),
+                                                   np.sin(angles)))
+            )
+        else:
+            steps = rng.normal(0, 1, (int(rng.integers(2, 12)), 2))
+            contours.append(origin + np.cumsum(steps, axis=0))
+    return contours
+
+
+def _legacy_sort_contours(contours: list) -> list:
+    # The O(n^2) first point greedy ordering that order_contours replaced.
+    contours = list(contours)
+    sorted_contours = [contours.pop(0)]
+    while contours:
+        last_point = sorted_contours[-1][-1]
+        next_index = min(
+            range(len(contours)),
+            key=lambda i: np.linalg.norm(last_point - contours[i][0])
+        )
+        sorted_contours.append(contours.pop(next_index))
+    return sorted_contours
+
+
+def bench_ordering(counts=(500, 1_000, 2_000)) -> None:
+    """Compares ordering time and pen-up travel of the first point greedy
+    ordering against the KD-tree endpoint-aware ordering, with and without
+    a 2 second 2-opt/Or-opt refinement."""
+    for count in counts:
+        contours = _synthetic_contours(count)
+        print(f"{count} contours "
+              f"(unordered travel {pen_up_travel(contours):.0f} mm):")
+        for name, order in (
+                ("first point greedy", _legacy_sort_contours),
+                ("kd-tree endpoints", img_proc.sort_contours),
+                ("kd-tree + 2-opt", lambda contours: refine_contour_order(
+                    img_proc.sort_contours(contours), time_budget=2.0))):
+            start = time.perf_counter()
+            ordered = order(contours)
+            elapsed = time.perf_counter() - start
+            print(f"\t{name:<20} {elapsed * 1000:9.1f} ms, "
+                  f"pen-up travel {pen_up_travel(ordered):8.0f} mm")
+
+
+def bench_hilbert_ordering(counts=(1_000, 10_000, 100_000)) -> None:
+    """Compares ordering time and pen-up travel of sort_contours in its
+    greedy and Hilbert curve modes."""
+    for count in counts:
+        contours = _synthetic_contours(count)
+        print(f"{count} contours:")
+        for mode in ("greedy", "hilbert"):
+            start = time.perf_counter()
+            ordered = img_proc.sort_contours(contours, mode=mode)
+            elapsed = time.perf_counter() - start
+            print(f"\t{mode:<8} {elapsed * 1000:9.1f} ms, "
+                  f"pen-up travel {pen_up_travel(ordered):9.0f} mm")
+
+
+def _peak_memory(func):
+    # Runs func and returns its result and the peak memory it allocated
+    # (bytes) that was traced while it ran.
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def _peak_rss(func) -> int:
+    # Runs func in a forked child process and returns how far (bytes) the
+    # child's peak resident memory rose above what it started with. Unlike
+    # tracemalloc this includes native buffers, such as OpenCV's images.
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+
+    def measure():
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        func()
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        sender.send((after - before) * 1024)  # ru_maxrss is in KiB
+
+    process = context.Process(target=measure)
+    process.start()
+    peak = receiver.recv()
+    process.join()
+    return peak
+
+
+def bench_contour_memory(
+        new_dimensions=(800, 800),
+        detail_level: float = 1.0) -> None:
+    """Compares the memory of holding the smoothed contours of the sample
+    images as a list of float64 arrays wrapped in an object array (as the
+    pipeline used to) against a ContourSet."""
+    for name, cv_image in _load_sample_images().items():
+        contours = list(img_proc.ExtractionPipeline(cv_image).run(
+            new_dimensions, detail_level, smoothing_workers=1
+        ))
+        point_count = sum(len(contour) for contour in contours)
+        print(f"{name}: {len(contours)} contours, {point_count} points")
+
+        def to_object_array():
+            arrays = np.empty(len(contours), dtype=object)
+            arrays[:] = [
+                np.array(contour, dtype=np.float64) for contour in contours
+            ]
+            return arrays
+
+        _, legacy_peak = _peak_memory(to_object_array)
+        contour_set, set_peak = _peak_memory(
+            lambda: ContourSet.from_contours(contours)
+        )
+        print(f"\tlist + object array: {legacy_peak / 1024:9.1f} KiB peak")
+        print(f"\tContourSet:          {set_peak / 1024:9.1f} KiB peak, "
+              f"{contour_set.nbytes / 1024:.1f} KiB buffers "
+              f"({legacy_peak / max(set_peak, 1):.1f}x less)")
+
+
+def bench_ingest_memory(
+        scales=(1, 4),
+        new_dimensions=(210, 210)) -> None:
+    """Reports the peak resident memory of each ingest stage (decode,
+    contrast, detail level and preprocess) for the sample images upscaled
+    by each scale and encoded as JPEG and PNG, against a full size decode
+    and a float64 Laplacian of the whole image. Each stage is measured in
+    its own process."""
+    for name, cv_image in _load_sample_images().items():
+        for scale in scales:
+            image = cv2.resize(cv_image, None, fx=scale, fy=scale)
+            height, width = image.shape[:2]
+            for extension in (".jpg", ".png"):
+                content = cv2.imencode(extension, image)[1].tobytes()
+                print(f"{name} at {width}x{height} as {extension}:")
+
+                def full_decode():
+                    return cv2.imdecode(
+                        np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR
+                    )
+
+                full = full_decode()
+                print(f"\tlegacy decode:  "
+                      f"{_peak_rss(full_decode) / 1024:9.1f} KiB peak")
+                laplacian_peak = _peak_rss(
+                    lambda: cv2.Laplacian(full, cv2.CV_64F).var()
+                )
+                print(f"\tlegacy detail:  "
+                      f"{laplacian_peak / 1024:9.1f} KiB peak")
+                del full
+
+                decoded = decode_image(content)
+                if decoded is None:
+                    print("\tdoes not fit in the memory budget")
+                    continue
+                pipeline = img_proc.ExtractionPipeline(decoded)
+                stages = {
+                    "decode": _peak_rss(lambda: decode_image(content)),
+                    "contrast": _peak_rss(pipeline.contrast),
+                    "detail": _peak_rss(
+                        lambda: img_proc.calculate_image_detail_level(
+                            decoded
+                        )
+                    ),
+                    "preprocess": _peak_rss(
+                        lambda: pipeline.preprocess(new_dimensions)
+                    ),
+                }
+                for stage, peak in stages.items():
+                    print(f"\t{stage + ':':<15} {peak / 1024:9.1f} KiB peak")
+
+
+def bench_progressive_preview(new_dimensions=(210, 210)) -> None:
+    """Times the preview of a progressive extraction of the sample images
+    and the time until its final refinement, against a full extraction."""
+    for name, cv_image in _load_sample_images().items():
+        start = time.perf_counter()
+        img_proc.extract_contours(cv_image, new_dimensions)
+        full_time = time.perf_counter() - start
+
+        done = threading.Event()
+        times = []
+
+        def on_update(contours, final):
+            times.append((time.perf_counter() - start, len(contours)))
+            if final:
+                done.set()
+
+        extractor = img_proc.ProgressiveExtractor()
+        start = time.perf_counter()
+        preview = extractor.request(cv_image, new_dimensions, on_update)
+        preview_time = time.perf_counter() - start
+        done.wait()
+
+        print(f"{name}: full extraction {full_time * 1000:8.1f} ms")
+        print(f"\tpreview:    {preview_time * 1000:8.1f} ms, "
+              f"{len(preview)} contours")
+        for stage, (elapsed, count) in zip(("simplified", "final"), times):
+            print(f"\t{stage + ':':<11} {elapsed * 1000:8.1f} ms, "
+                  f"{count} contours")
+
+
+def bench_tiled_extraction(
+        sizes=(1_000, 2_000, 4_000),
+        tile_size: int = 512,
+        tile_workers: int = 4) -> None:
+    """Times Canny edges and contour tracing on the sample images at each
+    drawing size, untiled and tiled, and compares the tiled raw, smoothed
+    and sorted contours with the untiled ones: their counts, points, pen-up
+    travel and how far their points are from each other."""
+    for name, cv_image in _load_sample_images().items():
+        print(f"{name}:")
+        for size in sizes:
+            new_dimensions = (size, size)
+
+            def pipeline(tile_size=None):
+                return img_proc.ExtractionPipeline(
+                    cv_image, tile_size=tile_size, tile_workers=tile_workers
+                )
+
+            untiled_time = _best_time(
+                lambda: pipeline().raw_contours(new_dimensions)
+            )
+            tiled_time = _best_time(
+                lambda: pipeline(tile_size).raw_contours(new_dimensions)
+            )
+            print(f"\t{size}x{size}: untiled {untiled_time * 1000:8.1f} ms, "
+                  f"tiled {tiled_time * 1000:8.1f} ms "
+                  f"({untiled_time / tiled_time:.2f}x)")
+
+            untiled, tiled = pipeline(), pipeline(tile_size)
+            outputs = {
+                "raw": tuple(
+                    ContourSet.from_contours(
+                        extraction.raw_contours(new_dimensions),
+                        extraction.raw_closed(new_dimensions)
+                    )
+                    for extraction in (untiled, tiled)
+                ),
+                "smoothed": (untiled.run(new_dimensions, 1.0),
+                             tiled.run(new_dimensions, 1.0)),
+            }
+            outputs["sorted"] = tuple(
+                img_proc.sort_contours(stitch_contours(smoothed))
+                for smoothed in outputs["smoothed"]
+            )
+            for stage, (untiled_contours, tiled_contours) in outputs.items():
+                distance = max(
+                    _max_contour_distance(
+                        untiled_contours, tiled_contours, size
+                    ),
+                    _max_contour_distance(
+                        tiled_contours, untiled_contours, size
+                    )
+                )
+                print(f"\t\t{stage + ':':<9} "
+                      f"{_contour_summary(untiled_contours)} -> "
+                      f"{_contour_summary(tiled_contours)}, "
+                      f"max distance {distance:.1f} px")
+            print(f"\t\tpen-up travel "
+                  f"{pen_up_travel(outputs['sorted'][0]):.0f} -> "
+                  f"{pen_up_travel(outputs['sorted'][1]):.0f} px")
+
+
+def _contour_summary(contours) -> str:
+    # Number of contours and of their points.
+    point_count = sum(len(contour) for contour in contours)
+    return f"{len(contours)} contours/{point_count} points"
+
+
+def _max_contour_distance(contours, other_contours, size: int) -> float:
+    # Largest distance (px) from a point of other_contours to the nearest
+    # pixel of the contours drawn on a size x size canvas, with the closed
+    # contours of a ContourSet drawn closed. Points are rounded to the
+    # nearest pixel.
+    def to_pixels(contours):
+        return [
+            np.clip(np.round(np.reshape(contour, (-1, 2))), 0, size - 1)
+            .astype(np.int32) for contour in contours
+        ]
+
+    closed = getattr(contours, "closed", np.zeros(len(contours), bool))
+    canvas = np.full((size, size), 255, dtype=np.uint8)
+    for contour, is_closed in zip(to_pixels(contours), closed):
+        cv2.polylines(canvas, [contour], bool(is_closed), 0)
+    distances = cv2.distanceTransform(canvas, cv2.DIST_L2, 3)
+    points = np.concatenate(to_pixels(other_contours))
+    return float(distances[points[:, 1], points[:, 0]].max())
+
+
+def bench_calibrate_presets(
+        sizes=(150, 210, 300),
+        detail_levels=(None, 0.0, 0.5, 1.0)) -> None:
+    """Fits the extraction cost model of each preset on the sample images
+    and prints it (to paste into EXTRACTION_COST_MODEL in image_processing),
+    then how far its predictions are from the measured times."""
+    samples = []
+    for cv_image in _load_sample_images().values():
+        for size in sizes:
+            new_dimensions = (size, size)
+            pipeline = img_proc.ExtractionPipeline(cv_image)
+            point_count = sum(
+                len(contour)
+                for contour in pipeline.raw_contours(new_dimensions)
+            )
+            for detail_level in detail_levels:
+                if detail_level is None:
+                    detail_level = pipeline.detail_level(new_dimensions)
+                samples.append(
+                    (cv_image, new_dimensions, point_count, detail_level)
+                )
+
+    cost_model = {}
+    for preset in img_proc.EXTRACTION_PRESETS:
+        features, times = [], []
+        for cv_image, new_dimensions, point_count, detail_level in samples:
+            times.append(1000 * _best_time(
+                lambda: img_proc.ExtractionPipeline(
+                    cv_image, preset=preset
+                ).run(new_dimensions, detail_level, smoothing_workers=1)
+            ))
+            features.append(
+                (1.0, point_count, point_count * detail_level)
+            )
+        coefficients = np.linalg.lstsq(
+            np.array(features), np.array(times), rcond=None
+        )[0]
+        cost_model[preset] = tuple(
+            float(f"{value:.4g}") for value in coefficients
+        )
+        errors = np.array(features) @ cost_model[preset] - np.array(times)
+        print(f"{preset}: mean {np.mean(times):.1f} ms, "
+              f"mean abs error {np.mean(np.abs(errors)):.1f} ms, "
+              f"max error {np.max(np.abs(errors)):.1f} ms")
+
+    print("EXTRACTION_COST_MODEL = {")
+    for preset, coefficients in cost_model.items():
+        print(f'    "{preset}": {coefficients},')
+    print("}")
+
+
+def bench_presets(deadlines_ms=(20, 100, 500)) -> None:
+    """Extracts the sample images with each deadline and prints the preset
+    chosen, its predicted time and the time extraction actually took."""
+    for name, cv_image in _load_sample_images().items():
+        print(f"{name}:")
+        for deadline_ms in deadlines_ms:
+            contours, report = img_proc.extract_contours(
+                cv_image, (210, 210), deadline_ms=deadline_ms,
+                smoothing_workers=1, return_report=True
+            )
+            print(f"\t{deadline_ms:4d} ms deadline: {report['preset']:<8} "
+                  f"predicted {report['predicted_time'] * 1000:7.1f} ms, "
+                  f"took {report['wall_time'] * 1000:7.1f} ms, "
+                  f"{len(contours)} contours")
+
+
+def bench_overdraw(new_dimensions=(210, 210)) -> None:
+    """Reports the pen-down length trimmed from the stitched and ordered
+    strokes of the sample images by remove_overdraw, and its time. The
+    minimum gap is the one the motor model gives for the default arm."""
+    min_gap = img_proc.pen_lift_gap(
+        BASE_HEIGHT, ARM_LEN_1, ARM_LEN_2, SWEEP_OFFSET, PEN_UP_DISTANCE
+    )
+    print(f"Minimum gap: {min_gap:.1f} mm")
+    for name, cv_image in _load_sample_images().items():
+        strokes = img_proc.sort_contours(stitch_contours(
+            img_proc.extract_contours(cv_image, new_dimensions)
+        ))
+        elapsed = _best_time(
+            lambda: remove_overdraw(strokes, min_gap=min_gap)
+        )
+        _, report = remove_overdraw(
+            strokes, min_gap=min_gap, return_report=True
+        )
+        saved = report["pen_down_before"] - report["pen_down_after"]
+        print(f"{name}: {elapsed * 1000:.1f} ms, pen-down "
+              f"{report['pen_down_before']:.0f} mm -> "
+              f"{report['pen_down_after']:.0f} mm "
+              f"({saved / report['pen_down_before']:.1%} less), "
+              f"{report['strokes_before']} -> {report['strokes_after']} "
+              f"strokes")
+
+
+def bench_noise_suppression(new_dimensions=(210, 210)) -> None:
+    """Compares the raw contour count and end-to-end extraction time of the
+    sample images with the quality preset, without noise suppression and
+    with each preset's noise suppression settings."""
+    variants = {
+        "none": {"bilateral": None, "morphology": 0, "min_edge_pixels": 0},
+        **{
+            preset: img_proc._extraction_settings(  # pylint: disable=protected-access
+                preset)["noise_suppression"]
+            for preset in img_proc.EXTRACTION_PRESETS
+        },
+    }
+    for name, cv_image in _load_sample_images().items():
+        print(f"{name}:")
+        for variant, noise_suppression in variants.items():
+            raw_contours = img_proc.ExtractionPipeline(
+                cv_image, noise_suppression=noise_suppression
+            ).raw_contours(new_dimensions)
+            elapsed = _best_time(lambda: img_proc.extract_contours(
+                cv_image, new_dimensions, smoothing_workers=1,
+                noise_suppression=noise_suppression
+            ))
+            print(f"\t{variant:<9} {len(raw_contours):5d} raw contours "
+                  f"({sum(len(c) for c in raw_contours):6d} points), "
+                  f"{elapsed * 1000:7.1f} ms")
+
+
+def bench_batch_ik(count: int = 100_000) -> None:
+    """Times converting random points around the arm to motor steps one
+    at a time with get_real_angles and deg_to_steps against
+    get_steps_batch, and checks that they give the same steps."""
+    rng = np.random.default_rng(0)
+    reach = ARM_LEN_1 + ARM_LEN_2
+    points = np.column_stack((
+        rng.uniform(-reach, reach, (count, 2)),
+        rng.uniform(BASE_HEIGHT - reach, BASE_HEIGHT, count),
+    ))
+
+    def scalar_steps():
+        steps = []
+        for x, y, z in points.tolist():
+            angles = get_real_angles(x, y, z, BASE_HEIGHT, ARM_LEN_1,
+                                     ARM_LEN_2)
+            steps.append(
+                tuple(deg_to_steps(angles[motor]) for motor in "xyza")
+                if angles else None
+            )
+        return steps
+
+    scalar_time = _best_time(scalar_steps, repeats=1)
+    batch_time = _best_time(
+        lambda: get_steps_batch(points, BASE_HEIGHT, ARM_LEN_1, ARM_LEN_2)
+    )
+    steps, reachable = get_steps_batch(
+        points, BASE_HEIGHT, ARM_LEN_1, ARM_LEN_2
+    )
+    mismatches = sum(
+        expected != (tuple(row) if is_reachable else None)
+        for expected, row, is_reachable in zip(
+            scalar_steps(), steps.tolist(), reachable.tolist())
+    )
+    print(f"{count} points: scalar {scalar_time * 1000:.0f} ms, "
+          f"batch {batch_time * 1000:.1f} ms "
+          f"({scalar_time / batch_time:.0f}x), {mismatches} mismatches")
+
+
+BENCHMARKS = {
+    "parallel_smoothing": bench_parallel_smoothing,
+    "refinement": bench_refinement,
+    "ordering": bench_ordering,
+    "hilbert_ordering": bench_hilbert_ordering,
+    "contour_memory": bench_contour_memory,
+    "ingest_memory": bench_ingest_memory,
+    "progressive_preview": bench_progressive_preview,
+    "tiled_extraction": bench_tiled_extraction,
+    "calibrate_presets": bench_calibrate_presets,
+    "presets": bench_presets,
+    "overdraw": bench_overdraw,
+    "noise_suppression": bench_noise_suppression,
+    "batch_ik": bench_batch_ik,
+}
+
+
+if __name__ == "__main__":
+    for bench_name in sys.argv[1:] or BENCHMARKS:
+        print(f"== {bench_name} ==")
+        BENCHMARKS[bench_name]()
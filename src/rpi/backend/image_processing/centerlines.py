@@ -0,0 +1,107 @@
+"""
+Centerline (skeleton) extraction for line-art images.
+
+Canny outlines both sides of every dark stroke, so each line would be drawn
+twice. Instead, the dark strokes are thresholded, thinned to 1 pixel wide
+skeletons and traced into polylines along their centers.
+"""
+
+import cv2
+import numpy as np
+from skimage.morphology import skeletonize
+
+
+# 8-connected neighbour offsets (row, column)
+_NEIGHBOUR_OFFSETS = (
+    (-1, -1), (-1, 0), (-1, 1),
+    (0, -1), (0, 1),
+    (1, -1), (1, 0), (1, 1),
+)
+
+
+def extract_centerlines(gray_image, return_closed: bool = False):
+    """Threshold the dark strokes of a grayscale image, skeletonize them
+    and trace the skeleton into polylines. The polylines are returned in
+    the same format as cv2.findContours contours, (n, 1, 2) int32 arrays of
+    (x, y) points. If return_closed is True a (polylines, closed) tuple is
+    returned, where closed flags the polylines that are loops."""
+    # Dark shapes on a white background become the foreground
+    _, strokes = cv2.threshold(
+        gray_image, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU
+    )
+    skeleton = skeletonize(strokes > 0)
+
+    contours, closed = [], []
+    for path in _trace_skeleton(skeleton):
+        # Like findContours, loops don't repeat their start point at the end
+        # (RDP would collapse a contour whose ends are the same point)
+        is_loop = len(path) > 2 and path[0] == path[-1]
+        if is_loop:
+            path = path[:-1]
+        contours.append(
+            np.array(path, dtype=np.int32)[:, ::-1].reshape(-1, 1, 2)
+        )
+        closed.append(is_loop)
+
+    if return_closed:
+        return contours, closed
+    return contours
+
+
+def _trace_skeleton(skeleton) -> list[list[tuple[int, int]]]:
+    # Traces a 1 pixel wide skeleton into paths of (row, column) pixels.
+    # Paths run between nodes (ends and junctions, pixels without exactly
+    # two neighbours). Loops without any nodes are traced separately.
+    rows, cols = np.nonzero(skeleton)
+    pixels = set(zip(rows.tolist(), cols.tolist()))
+
+    def neighbours(pixel):
+        row, col = pixel
+        return [
+            (row + d_row, col + d_col) for d_row, d_col in _NEIGHBOUR_OFFSETS
+            if (row + d_row, col + d_col) in pixels
+        ]
+
+    def edge(a, b):
+        return (a, b) if a < b else (b, a)
+
+    nodes = sorted(pixel for pixel in pixels if len(neighbours(pixel)) != 2)
+    node_set = set(nodes)
+    visited_edges = set()
+
+    def walk(start, first_step):
+        # Follows unvisited edges from start until a node or a dead end
+        path = [start]
+        previous, current = start, first_step
+        visited_edges.add(edge(start, first_step))
+        while True:
+            path.append(current)
+            if current in node_set:
+                return path
+            next_steps = [
+                pixel for pixel in neighbours(current)
+                if pixel != previous
+                and edge(current, pixel) not in visited_edges
+            ]
+            if not next_steps:
+                return path
+            previous, current = current, next_steps[0]
+            visited_edges.add(edge(previous, current))
+
+    paths = []
+    for node in nodes:
+        if not neighbours(node):
+            paths.append([node])  # Isolated dot
+        for pixel in neighbours(node):
+            if edge(node, pixel) not in visited_edges:
+                paths.append(walk(node, pixel))
+
+    # Whatever is left are closed loops with no nodes
+    for pixel in sorted(pixels):
+        for neighbour in neighbours(pixel):
+            if edge(pixel, neighbour) not in visited_edges:
+                node_set.add(pixel)  # Stop the walk back at the start
+                paths.append(walk(pixel, neighbour))
+                node_set.discard(pixel)
+
+    return paths
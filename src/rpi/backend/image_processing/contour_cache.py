@@ -0,0 +1,110 @@
+"""
+Persistent on-disk cache of extracted contours.
+
+Entries are keyed by a hash of the decoded image and the extraction
+parameters, and stored as compressed .npz files. The least recently used
+entries are evicted once the cache grows past its size limit.
+"""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from src.rpi.backend.constants import (
+    CONTOUR_CACHE_DIR,
+    CONTOUR_CACHE_MAX_BYTES,
+)
+from src.rpi.backend.image_processing.contour_set import ContourSet
+
+
+class ContourCache:
+    """Content-addressed contour cache stored in a directory."""
+    def __init__(
+            self,
+            cache_dir: str = CONTOUR_CACHE_DIR,
+            max_bytes: int = CONTOUR_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(cv_image, **params) -> str:
+        """Hash of the decoded image pixels and the extraction parameters."""
+        image = np.ascontiguousarray(cv_image)
+        digest = hashlib.sha256()
+        digest.update(f"{image.shape}{image.dtype}".encode())
+        digest.update(memoryview(image).cast("B"))
+        for name in sorted(params):
+            digest.update(f"{name}={params[name]!r};".encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key: str) -> tuple[ContourSet, dict] | None:
+        """Returns the cached contours and any extra values stored with
+        them, or None on a miss."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                points = data["points"]
+                offsets = data["offsets"]
+                closed = data["closed"] if "closed" in data.files else None
+                extras = {
+                    name: data[name].item() for name in data.files
+                    if name not in ("points", "offsets", "closed")
+                }
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            print(f"Contour cache miss ({self.stats_text()})")
+            return None
+
+        os.utime(path)  # Mark as recently used
+        self.hits += 1
+        print(f"Contour cache hit ({self.stats_text()})")
+        return ContourSet(points, offsets, closed), extras
+
+    def put(self, key: str, contours, **extras) -> None:
+        """Stores contours (and scalar extra values) under the key, then
+        evicts least recently used entries if over the size limit."""
+        contours = ContourSet.from_contours(contours)
+        points, offsets = contours.points, contours.offsets
+        closed = contours.closed
+
+        # Write to a temporary file first so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(
+                f, points=points, offsets=offsets, closed=closed,
+                **{name: np.asarray(value) for name, value in extras.items()}
+            )
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        # Deletes the least recently used entries until within max_bytes.
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npz"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def stats(self) -> dict[str, int]:
+        """Hit and miss counts since the cache was created."""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def stats_text(self) -> str:
+        """Hit and miss counts as readable text."""
+        return f"{self.hits} hit(s), {self.misses} miss(es)"
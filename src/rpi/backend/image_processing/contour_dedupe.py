@@ -0,0 +1,144 @@
+"""
+Removes duplicate and nested near-identical contours.
+
+Canny edges of a stroke come out of findContours as inner and outer copies
+of the same outline a pixel or two apart. Contour points are bucketed into
+a spatial hash grid, points are only compared with the points of other
+contours in nearby cells, and any contour mostly within the tolerance of a
+longer one is dropped.
+"""
+
+import numpy as np
+
+
+# Points within this distance (mm) of another contour are covered by it
+DEDUPE_TOLERANCE = 1.5
+
+# Fraction of a contour that must be covered by another for it to be dropped
+DEDUPE_COVERAGE = 0.9
+
+
+def remove_duplicate_contours(
+        contours,
+        tolerance: float = DEDUPE_TOLERANCE,
+        coverage: float = DEDUPE_COVERAGE,
+        return_report: bool = False):
+    """
+    Drop every contour that a longer contour already covers, where covered
+    means at least `coverage` of its length lies within `tolerance` (mm)
+    of the other contour. Contours keep their order and format.
+
+    The number of contours and points removed is printed. If return_report
+    is True a (contours, report) tuple is returned, where the report holds
+    those values and a kept mask of the input contours.
+    """
+    contours = list(contours)
+    points = [np.asarray(c, dtype=float).reshape(-1, 2) for c in contours]
+    keep = _keep_mask(points, tolerance, coverage) if contours else []
+
+    kept_contours = [c for c, is_kept in zip(contours, keep) if is_kept]
+    report = {
+        "contours_removed": len(contours) - len(kept_contours),
+        "points_removed": sum(
+            len(p) for p, is_kept in zip(points, keep) if not is_kept
+        ),
+        "kept": list(keep),
+    }
+    print(f"Removed {report['contours_removed']} duplicate contour(s), "
+          f"{report['points_removed']} point(s)")
+
+    if return_report:
+        return kept_contours, report
+    return kept_contours
+
+
+def _keep_mask(contours, tolerance: float, coverage: float) -> list[bool]:
+    # Whether to keep each contour. Contours are sampled evenly along their
+    # length so sparse points (e.g. long straight runs) still count.
+    samples = [_resample(contour, tolerance / 2) for contour in contours]
+    sample_counts = np.array([len(s) for s in samples])
+    owners = np.repeat(np.arange(len(samples)), sample_counts)
+    cells = np.floor(np.concatenate(samples) / tolerance).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # Keep neighbour cells non-negative
+    width = int(cells[:, 1].max()) + 2
+
+    def cell_keys(cell_x, cell_y):
+        return cell_x * width + cell_y
+
+    # Every sample in the grid, sorted by cell
+    sample_keys = cell_keys(cells[:, 0], cells[:, 1])
+    table = np.argsort(sample_keys, kind="stable")
+    table_keys = sample_keys[table]
+    points = np.concatenate(samples)
+
+    # Find the samples of other contours within the tolerance of each
+    # sample, among the samples in the 3x3 cells around it
+    near_samples, near_owners = [], []
+    for d_x in (-1, 0, 1):
+        for d_y in (-1, 0, 1):
+            keys = cell_keys(cells[:, 0] + d_x, cells[:, 1] + d_y)
+            first = np.searchsorted(table_keys, keys, side="left")
+            last = np.searchsorted(table_keys, keys, side="right")
+            counts = last - first
+            sample_ids = np.repeat(np.arange(len(keys)), counts)
+            offsets = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            other_ids = table[first[sample_ids] + offsets]
+            near = (owners[sample_ids] != owners[other_ids]) & (
+                np.linalg.norm(points[sample_ids] - points[other_ids], axis=1)
+                <= tolerance
+            )
+            near_samples.append(sample_ids[near])
+            near_owners.append(owners[other_ids[near]])
+
+    pairs = np.unique(
+        np.column_stack(
+            (np.concatenate(near_samples), np.concatenate(near_owners))
+        ),
+        axis=0
+    )
+
+    # Fraction of each contour's samples near each other contour
+    covered, covered_by = owners[pairs[:, 0]], pairs[:, 1]
+    candidates, covered_counts = np.unique(
+        np.column_stack((covered, covered_by)), axis=0, return_counts=True
+    )
+    fractions = covered_counts / sample_counts[candidates[:, 0]]
+    candidates = candidates[fractions >= coverage]
+
+    # Longest contours first, each dropped if a kept contour covers it
+    lengths = np.array([_length(contour) for contour in contours])
+    covering: dict[int, list[int]] = {}
+    for contour_id, other_id in candidates.tolist():
+        covering.setdefault(contour_id, []).append(other_id)
+
+    keep = np.ones(len(contours), dtype=bool)
+    for contour_id in np.argsort(-lengths, kind="stable").tolist():
+        for other_id in covering.get(contour_id, []):
+            longer = (lengths[other_id], -other_id) > (
+                lengths[contour_id], -contour_id)
+            if longer and keep[other_id]:
+                keep[contour_id] = False
+                break
+    return keep.tolist()
+
+
+def _length(contour) -> float:
+    # Polyline length of a contour.
+    return float(np.linalg.norm(np.diff(contour, axis=0), axis=1).sum())
+
+
+def _resample(contour, spacing: float):
+    # Points evenly spaced (at most the spacing apart) along a contour.
+    if len(contour) < 2:
+        return contour
+    distances = np.concatenate(
+        ([0.0], np.cumsum(np.linalg.norm(np.diff(contour, axis=0), axis=1)))
+    )
+    count = max(2, int(np.ceil(distances[-1] / spacing)) + 1)
+    positions = np.linspace(0, distances[-1], count)
+    return np.column_stack((
+        np.interp(positions, distances, contour[:, 0]),
+        np.interp(positions, distances, contour[:, 1]),
+    ))
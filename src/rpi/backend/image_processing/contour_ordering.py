@@ -0,0 +1,471 @@
+"""
+Orders contours to minimize pen-up travel between them.
+Open contours may be drawn from either end and closed loops may be started
+from any of their points, whichever is nearest to the pen. An ordering can
+then be improved with 2-opt and Or-opt local search. For very large contour
+sets, contours can instead be ordered along a Hilbert curve.
+"""
+
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+# Open contours whose ends are closer than this (mm) may still be entered
+# anywhere like closed loops. Entering one anywhere joins its ends, so this
+# is kept under half the pen's width, where the join doesn't show.
+CLOSED_CONTOUR_TOLERANCE = 0.2
+
+# Longest run of contours Or-opt will try to move elsewhere in the tour
+OR_OPT_MAX_SEGMENT = 3
+
+# Hilbert curve order, the drawing is divided into a 2^n by 2^n grid
+HILBERT_ORDER = 16
+
+# Undrawn endpoints on either side of the pen's place on the Hilbert curve
+# that are considered for the next contour
+HILBERT_WINDOW = 3
+
+
+def order_contours(
+        contours,
+        start=None,
+        closed=None,
+        closed_tolerance: float = CLOSED_CONTOUR_TOLERANCE) -> list:
+    """
+    Greedily order contours by the nearest entry point to the pen, using a
+    KD-tree over both endpoints of every open contour and every point of
+    every closed loop. Open contours are reversed when entered from their
+    last point. Closed loops are rotated to start at the entry point and
+    closed so they end back where they started.
+
+    A contour is a closed loop if it is marked True in closed (one bool
+    per contour, e.g. for findContours outlines, which implicitly end at
+    their first point), if its first point is its last, or if its ends are
+    within closed_tolerance (mm). Contours whose ends are further apart are
+    never closed, so a "C" is never drawn as an "O".
+
+    The pen starts at the given (x, y) start point, or at the first point of
+    the first contour if no start is given.
+    """
+    contours = [np.asarray(contour).reshape(-1, 2) for contour in contours]
+    if closed is None:
+        closed = [False] * len(contours)
+    closed = [
+        bool(is_closed) or _is_closed(contour, closed_tolerance)
+        for contour, is_closed in zip(contours, closed)
+        if len(contour)
+    ]
+    contours = [contour for contour in contours if len(contour)]
+    if not contours:
+        return []
+
+    entry_points, entry_owners, entry_positions = _entry_points(
+        contours, closed
+    )
+    entry_counts = np.bincount(entry_owners, minlength=len(contours))
+
+    visited = np.zeros(len(contours), dtype=bool)
+    tree_entries = np.arange(len(entry_points))
+    tree = cKDTree(entry_points)
+    dead_entries = 0
+
+    pen = contours[0][0] if start is None else np.asarray(start, dtype=float)
+    ordered_contours = []
+    for _ in range(len(contours)):
+        # Rebuild the tree without visited contours once most are dead
+        if dead_entries > len(tree_entries) - dead_entries:
+            tree_entries = tree_entries[~visited[entry_owners[tree_entries]]]
+            tree = cKDTree(entry_points[tree_entries])
+            dead_entries = 0
+
+        entry = _nearest_unvisited_entry(
+            tree, tree_entries, entry_owners, visited, pen
+        )
+        owner = entry_owners[entry]
+        position = entry_positions[entry]
+        visited[owner] = True
+        dead_entries += entry_counts[owner]
+
+        contour = contours[owner]
+        if closed[owner]:
+            contour = _rotate_closed_contour(contour, position)
+        elif position != 0:
+            contour = contour[::-1]
+
+        ordered_contours.append(contour)
+        pen = contour[-1]
+
+    return ordered_contours
+
+
+def pen_up_travel(contours, start=None) -> float:
+    """Total distance the pen travels between contours while lifted. If a
+    start point is given, the travel to the first contour is included."""
+    if len(contours) == 0:
+        return 0.0
+    starts = np.array([contour[0] for contour in contours], dtype=float)
+    ends = np.array([contour[-1] for contour in contours], dtype=float)
+    travel = np.linalg.norm(starts[1:] - ends[:-1], axis=1).sum()
+    if start is not None:
+        travel += np.linalg.norm(starts[0] - np.asarray(start, dtype=float))
+    return float(travel)
+
+
+def hilbert_order_contours(
+        contours,
+        start=None,
+        order: int = HILBERT_ORDER,
+        window: int = HILBERT_WINDOW) -> list:
+    """
+    Order contours along a Hilbert curve through both endpoints of every
+    contour, which is O(n log n) and much faster than greedy ordering for
+    tens of thousands of contours.
+
+    After drawing a contour, the pen is at its other endpoint's place on
+    the curve. The next contour is entered at whichever of the nearest
+    `window` undrawn endpoints on either side of that place is closest to
+    the pen, so each contour's direction is picked locally.
+
+    The pen starts at the given (x, y) start point, or at the first
+    endpoint on the curve if no start is given.
+    """
+    contours = [np.asarray(contour).reshape(-1, 2) for contour in contours]
+    contours = [contour for contour in contours if len(contour)]
+    if not contours:
+        return []
+
+    count = len(contours)
+    endpoints = np.array(
+        [contour[0] for contour in contours]
+        + [contour[-1] for contour in contours],
+        dtype=float
+    )
+    if start is not None:
+        endpoints = np.vstack((endpoints, np.asarray(start, dtype=float)))
+    indices = _hilbert_indices(endpoints, order)
+
+    # Endpoint k on the curve is the start (k < count) or end of a contour
+    curve = np.argsort(indices[:2 * count], kind="stable")
+    curve_positions = np.empty(2 * count, dtype=np.int64)
+    curve_positions[curve] = np.arange(2 * count)
+    if start is None:
+        position, pen = 0, endpoints[curve[0]]
+    else:
+        position = int(np.searchsorted(indices[curve], indices[-1]))
+        position, pen = min(position, 2 * count - 1), endpoints[-1]
+
+    curve_points = endpoints[curve].tolist()
+    curve, curve_positions = curve.tolist(), curve_positions.tolist()
+    pen_x, pen_y = map(float, pen)
+
+    # Links to the next/previous undrawn endpoint, with a sentinel at each
+    # end (slot = curve position + 1), path compressed as endpoints are used
+    next_links = list(range(2 * count + 2))
+    prev_links = list(range(2 * count + 2))
+
+    def find(links, slot):
+        root = slot
+        while links[root] != root:
+            root = links[root]
+        while links[slot] != root:
+            links[slot], slot = root, links[slot]
+        return root
+
+    ordered_contours = []
+    for _ in range(count):
+        candidates = []
+        slot = position + 1
+        for _ in range(window):
+            slot = find(next_links, slot)
+            if slot > 2 * count:
+                break
+            candidates.append(slot - 1)
+            slot += 1
+        slot = position + 1
+        for _ in range(window):
+            slot = find(prev_links, slot)
+            if slot < 1:
+                break
+            candidates.append(slot - 1)
+            slot -= 1
+
+        entry = min(
+            candidates,
+            key=lambda k: ((curve_points[k][0] - pen_x) ** 2
+                           + (curve_points[k][1] - pen_y) ** 2)
+        )
+        endpoint = curve[entry]
+        index = endpoint % count
+        exit_endpoint = index + count if endpoint < count else index
+
+        # Both of the contour's endpoints are now drawn
+        position = curve_positions[exit_endpoint]
+        for drawn in (entry, position):
+            next_links[drawn + 1] = drawn + 2
+            prev_links[drawn + 1] = drawn
+
+        contour = contours[index]
+        ordered_contours.append(contour if endpoint < count else contour[::-1])
+        pen_x, pen_y = curve_points[position]
+
+    return ordered_contours
+
+
+def refine_contour_order(
+        contours,
+        time_budget: float = 1.0,
+        start=None,
+        return_report: bool = False):
+    """
+    Improve the pen-up travel of an ordering with 2-opt and Or-opt moves
+    until no move helps or time_budget seconds have passed.
+
+    2-opt reverses a run of the tour (which also reverses every contour in
+    it) and Or-opt moves a run of up to OR_OPT_MAX_SEGMENT contours
+    elsewhere, either way round. Only the travel between contours changes,
+    the contours themselves are drawn the same.
+
+    The pen-up travel before and after is printed. If return_report is True
+    a (contours, report) tuple is returned, where the report holds the
+    travel before and after, the number of moves and the time taken.
+    """
+    start_time = time.perf_counter()
+    contours = [np.asarray(contour).reshape(-1, 2) for contour in contours]
+    tour = _Tour(contours, start)
+    travel_before = tour.travel()
+
+    moves = 0
+    improved = True
+    while improved and time.perf_counter() - start_time < time_budget:
+        improved = False
+        for improve in (tour.two_opt, tour.or_opt):
+            for i in range(len(contours)):
+                if time.perf_counter() - start_time >= time_budget:
+                    break
+                if improve(i):
+                    moves += 1
+                    improved = True
+
+    refined_contours = tour.contours()
+    report = {
+        "travel_before": travel_before,
+        "travel_after": tour.travel(),
+        "moves": moves,
+        "time": time.perf_counter() - start_time,
+    }
+    print(f"Pen-up travel {report['travel_before']:.0f} mm -> "
+          f"{report['travel_after']:.0f} mm after {moves} move(s) in "
+          f"{report['time'] * 1000:.0f} ms")
+
+    if return_report:
+        return refined_contours, report
+    return refined_contours
+
+
+class _Tour:
+    """
+    Order and direction of every contour in a drawing, reduced to the start
+    and end point of each contour.
+
+    Travel to the first contour only counts when there is a start point.
+    Points that don't exist (before the first contour without a start
+    point, after the last contour) are NaN and cost nothing to travel to.
+    """
+    def __init__(self, contours, start=None):
+        self._contours = contours
+        self.order = np.arange(len(contours))
+        self.reversed = np.zeros(len(contours), dtype=bool)
+        self.starts = np.array([c[0] for c in contours], dtype=float)
+        self.ends = np.array([c[-1] for c in contours], dtype=float)
+        self.pen_start = (
+            np.full(2, np.nan) if start is None
+            else np.asarray(start, dtype=float)
+        )
+
+    def _prev_ends(self):
+        # End point before each position, ends before[i] = end of i - 1
+        return np.vstack((self.pen_start, self.ends))
+
+    def _next_starts(self):
+        # Start point after each position, next[i] = start of i
+        return np.vstack((self.starts, np.full(2, np.nan)))
+
+    def travel(self) -> float:
+        """Total pen-up travel of the tour."""
+        return float(_distances(self._prev_ends(), self._next_starts()).sum())
+
+    def two_opt(self, i: int) -> bool:
+        """Applies the best reversal of positions i..j, if it shortens the
+        tour."""
+        prev_end = self._prev_ends()[i]
+        next_starts = self._next_starts()[i + 1:]
+        ends = self.ends[i:]
+        deltas = (
+            _distances(prev_end, ends)
+            + _distances(self.starts[i], next_starts)
+            - _distances(prev_end, self.starts[i])
+            - _distances(ends, next_starts)
+        )
+        best = int(np.argmin(deltas))
+        if deltas[best] >= -1e-9:
+            return False
+
+        j = i + best + 1
+        self.order[i:j] = self.order[i:j][::-1].copy()
+        self.reversed[i:j] = ~self.reversed[i:j][::-1]
+        starts = self.starts[i:j][::-1].copy()
+        self.starts[i:j] = self.ends[i:j][::-1]
+        self.ends[i:j] = starts
+        return True
+
+    def or_opt(self, i: int) -> bool:
+        """Applies the best move of a run of contours starting at position i
+        to somewhere else in the tour, if it shortens the tour."""
+        prev_ends = self._prev_ends()
+        next_starts = self._next_starts()
+        best = None
+        for length in range(1, OR_OPT_MAX_SEGMENT + 1):
+            j = i + length
+            if j > len(self.order) or length == len(self.order):
+                break
+
+            seg_start, seg_end = self.starts[i], self.ends[j - 1]
+            removal_gain = (
+                _distances(prev_ends[i], seg_start)
+                + _distances(seg_end, next_starts[j])
+                - _distances(prev_ends[i], next_starts[j])
+            )
+
+            # Gaps in the tour without the run, gap q is before remaining q
+            remaining = np.r_[0:i, j:len(self.order)]
+            gap_prev = np.vstack((self.pen_start, self.ends[remaining]))
+            gap_next = np.vstack((self.starts[remaining], np.full(2, np.nan)))
+            gap_cost = _distances(gap_prev, gap_next)
+
+            for is_reversed, (first, last) in enumerate(
+                    ((seg_start, seg_end), (seg_end, seg_start))):
+                deltas = (
+                    _distances(gap_prev, first)
+                    + _distances(last, gap_next)
+                    - gap_cost
+                    - removal_gain
+                )
+                if not is_reversed:
+                    deltas[i] = np.inf  # Putting it back changes nothing
+                q = int(np.argmin(deltas))
+                if deltas[q] < -1e-9 and (best is None or deltas[q] < best[0]):
+                    best = (deltas[q], length, q, bool(is_reversed))
+
+        if best is None:
+            return False
+
+        _, length, q, is_reversed = best
+        j = i + length
+        remaining = np.r_[0:i, j:len(self.order)]
+        segment = np.arange(i, j)
+        if is_reversed:
+            segment = segment[::-1]
+        new_positions = np.concatenate(
+            (remaining[:q], segment, remaining[q:])
+        )
+
+        starts, ends = self.starts.copy(), self.ends.copy()
+        if is_reversed:
+            starts[i:j], ends[i:j] = self.ends[i:j], self.starts[i:j]
+            self.reversed[i:j] = ~self.reversed[i:j]
+        self.order = self.order[new_positions]
+        self.reversed = self.reversed[new_positions]
+        self.starts = starts[new_positions]
+        self.ends = ends[new_positions]
+        return True
+
+    def contours(self) -> list:
+        """Contours in tour order, each drawn in its tour direction."""
+        return [
+            self._contours[index][::-1] if is_reversed
+            else self._contours[index]
+            for index, is_reversed in zip(self.order, self.reversed)
+        ]
+
+
+def _hilbert_indices(points, order: int):
+    # Index along a Hilbert curve of order n covering the points' bounding
+    # box for each (x, y) point.
+    side = 1 << order
+    low = points.min(axis=0)
+    extent = max(float((points.max(axis=0) - low).max()), 1e-9)
+    cells = ((points - low) / extent * (side - 1)).astype(np.int64)
+    x, y = cells[:, 0], cells[:, 1]
+
+    indices = np.zeros(len(points), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        indices += s * s * ((3 * rx) ^ ry)
+
+        # Rotate the quadrant so the curve's sub-curves line up
+        flip = ~ry & rx
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s >>= 1
+    return indices
+
+
+def _distances(a, b):
+    # Euclidean distances between points, 0 where either point is NaN.
+    return np.nan_to_num(np.linalg.norm(np.subtract(a, b), axis=-1))
+
+
+def _is_closed(contour, tolerance: float) -> bool:
+    # Whether the contour is a loop (its first point is its last, or its
+    # ends are within the tolerance).
+    if len(contour) < 3:
+        return False
+    gap = np.linalg.norm(contour[-1].astype(float) - contour[0])
+    return bool(gap <= tolerance)
+
+
+def _entry_points(contours, closed):
+    # Points the pen may enter each contour at. Returns the points, the
+    # index of the contour each belongs to and its index within the contour.
+    points, owners, positions = [], [], []
+    for i, (contour, is_closed) in enumerate(zip(contours, closed)):
+        if is_closed:
+            contour_positions = np.arange(len(contour))
+        else:
+            contour_positions = np.array([0, len(contour) - 1])
+        points.append(contour[contour_positions])
+        owners.append(np.full(len(contour_positions), i))
+        positions.append(contour_positions)
+    return (
+        np.concatenate(points).astype(float),
+        np.concatenate(owners),
+        np.concatenate(positions),
+    )
+
+
+def _nearest_unvisited_entry(tree, tree_entries, entry_owners, visited, pen):
+    # Queries increasingly many neighbours until one belongs to a contour
+    # that hasn't been visited yet.
+    k = min(8, len(tree_entries))
+    while True:
+        _, indices = tree.query(pen, k=k)
+        for index in np.atleast_1d(indices):
+            entry = tree_entries[index]
+            if not visited[entry_owners[entry]]:
+                return entry
+        k = min(k * 4, len(tree_entries))
+
+
+def _rotate_closed_contour(contour, position: int):
+    # Rotates a closed contour to start at the given position and closes it
+    # by ending on that same point.
+    if len(contour) > 1 and np.array_equal(contour[0], contour[-1]):
+        contour = contour[:-1]  # Already explicitly closed
+        position %= len(contour)
+    contour = np.roll(contour, -position, axis=0)
+    return np.concatenate((contour, contour[:1]))
@@ -0,0 +1,103 @@
+"""
+Compact storage for a collection of contours.
+
+Contours have different numbers of points, so rather than a list of small
+arrays (or an object array of them), every point is stored in one flat
+float32 buffer and each contour is a range of it given by an offsets array.
+Whether each contour is a closed loop is kept alongside them.
+"""
+
+import numpy as np
+
+
+class ContourSet:
+    """
+    Ragged collection of (n, 2) contours in one flat coordinate buffer.
+
+    Contour i is points[offsets[i]:offsets[i + 1]]. Indexing and iterating
+    give read-only views into the buffer without copying, so a ContourSet
+    can be passed to anything that takes a list of contours.
+
+    closed[i] is True if contour i is a closed loop whose last point joins
+    back to its first, like the outlines cv2.findContours traces (the first
+    point isn't repeated at the end). Defaults to every contour being open.
+    """
+    def __init__(self, points, offsets, closed=None):
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        self.points = points.view()
+        self.points.flags.writeable = False
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if closed is None:
+            closed = np.zeros(len(self.offsets) - 1, dtype=bool)
+        self.closed = np.asarray(closed, dtype=bool)
+
+    @classmethod
+    def from_contours(cls, contours, closed=None) -> "ContourSet":
+        """Packs contours (any arrays of (x, y) points) into a ContourSet,
+        with the closed flags if given. A ContourSet is returned as is
+        unless closed flags are given."""
+        if isinstance(contours, ContourSet):
+            if closed is None:
+                return contours
+            return cls(contours.points, contours.offsets, closed)
+        contours = [np.asarray(contour).reshape(-1, 2) for contour in contours]
+        lengths = [len(contour) for contour in contours]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        points = np.empty((offsets[-1], 2), dtype=np.float32)
+        for contour, start, end in zip(contours, offsets, offsets[1:]):
+            points[start:end] = contour
+        return cls(points, offsets, closed)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.select(np.arange(len(self))[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ContourSet index out of range")
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield self.points[start:end]
+
+    def __repr__(self) -> str:
+        return (f"ContourSet({len(self)} contours, "
+                f"{len(self.points)} points)")
+
+    @property
+    def lengths(self):
+        """Number of points in each contour."""
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the points, offsets and closed buffers."""
+        return self.points.nbytes + self.offsets.nbytes + self.closed.nbytes
+
+    def select(self, indices) -> "ContourSet":
+        """New ContourSet of the contours at the given indices (or where a
+        boolean mask is True), in that order."""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        lengths = self.lengths[indices]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        point_indices = (
+            np.arange(offsets[-1])
+            - np.repeat(offsets[:-1], lengths)
+            + np.repeat(self.offsets[indices], lengths)
+        )
+        return ContourSet(
+            self.points[point_indices], offsets, self.closed[indices]
+        )
+
+    def transformed(self, offset=(0.0, 0.0), scale: float = 1.0):
+        """New ContourSet with every point moved by the (x, y) offset and
+        then scaled, in one operation over the whole buffer."""
+        points = (self.points + np.asarray(offset, dtype=np.float32)) * scale
+        return ContourSet(points, self.offsets, self.closed)
@@ -4,12 +4,50 @@ Functions to threshold and filter image contours from an AI-generated image.
 """
 
 import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import cv2
 import numpy as np
 from scipy.interpolate import splprep, splev
-from scipy.spatial import distance
 
-from src.rpi.backend.ik.ik import get_real_angles, deg_to_steps
+from src.rpi.backend.constants import (
+    DRAWING_TIME_TOLERANCE,
+    FIRMWARE_BAUD_RATE,
+    FIRMWARE_ECHO_CHARS,
+    MOTOR_ACCELERATION,
+    MOTOR_MAX_SPEEDS,
+    PEN_LIFT_THRESHOLD,
+)
+from src.rpi.backend.ik.ik import get_steps_batch
+from src.rpi.backend.image_processing.centerlines import extract_centerlines
+from src.rpi.backend.image_processing.contour_cache import ContourCache
+from src.rpi.backend.image_processing.contour_dedupe import (
+    DEDUPE_COVERAGE,
+    DEDUPE_TOLERANCE,
+    remove_duplicate_contours,
+)
+from src.rpi.backend.image_processing.contour_ordering import (
+    hilbert_order_contours,
+    order_contours,
+)
+from src.rpi.backend.image_processing.contour_set import ContourSet
+from src.rpi.backend.image_processing.noise_suppression import (
+    NOISE_SUPPRESSION,
+    remove_small_edges,
+    suppress_noise,
+)
+from src.rpi.backend.image_processing.overdraw import remove_overdraw
+from src.rpi.backend.image_processing.stroke_stitching import stitch_contours
+from src.rpi.backend.image_processing.tiled_extraction import (
+    tiled_canny,
+    tiled_find_contours,
+)
+from src.rpi.backend.image_processing.workspace_clipping import (
+    clip_to_workspace,
+)
 
 
 # Wide is used for high contrast, narrow is for low contrast
@@ -26,6 +64,76 @@ MIN_CONT_PTS_SMOOTH_RANGE = (70, 30)
 EPSILON_RANGE = (0.05, 0.5)
 SMOOTHNESS_RANGE = (10, 90)
 
+# Named extraction presets, from best to fastest, and what they change from
+# the constants above. The quality preset is the constants as they are.
+# Balanced simplifies harder, ignores and smooths fewer contours, dedupes
+# on a coarser grid and smooths out texture before edge detection, draft
+# also detects fewer edges, despeckles the image, skips deduping and only
+# smooths long contours.
+EXTRACTION_PRESETS = {
+    "quality": {},
+    "balanced": {
+        "min_cont_pts_ignore_range": (6, 16),
+        "min_cont_pts_smooth_range": (90, 45),
+        "epsilon_range": (0.3, 0.8),
+        "dedupe": (3.0, DEDUPE_COVERAGE),
+        "noise_suppression": {
+            **NOISE_SUPPRESSION, "bilateral": (5, 30, 5),
+            "min_edge_pixels": 12,
+        },
+    },
+    "draft": {
+        "edge_det_thresh": ((150, 250), (160, 180)),
+        "min_cont_pts_ignore_range": (8, 24),
+        "min_cont_pts_smooth_range": (200, 120),
+        "epsilon_range": (0.5, 1.5),
+        "dedupe": None,
+        "noise_suppression": {
+            "bilateral": (9, 50, 9), "morphology": 3, "min_edge_pixels": 12,
+        },
+    },
+}
+
+# Extraction time (ms) of each preset predicted as intercept + per_point *
+# raw points + per_detail_point * raw points * detail level. Fitted on the
+# sample images by the calibrate_presets benchmark.
+EXTRACTION_COST_MODEL = {
+    "quality": (13.43, 0.04164, -0.01801),
+    "balanced": (14.52, 0.009791, -0.003558),
+    "draft": (7.562, 0.000427, -0.0003101),
+}
+
+# Raw contours are either Canny edge outlines or skeleton centerlines
+EXTRACTION_MODES = ("canny", "skeleton")
+
+# Number of worker processes used to smooth contours (1 = serial). Inputs
+# with fewer points than the minimum are always smoothed serially.
+SMOOTHING_WORKERS = min(4, os.cpu_count() or 1)
+PARALLEL_SMOOTHING_MIN_POINTS = 20_000
+
+# Largest error (motor steps) allowed when resampling strokes in step space,
+# which are first sampled every STEP_RESAMPLE_SPACING mm
+STEP_TOLERANCE = 1.5
+STEP_RESAMPLE_SPACING = 0.25
+
+# Contrast and detail level of images at least twice this size (px) are
+# measured on a downsampled copy about this size, the size of the generated
+# images the thresholds were chosen for. The Laplacian is computed this many
+# rows at a time.
+ANALYSIS_MAX_SIDE = 1024
+LAPLACIAN_BAND_ROWS = 64
+
+# Number of threads used to extract edges and contours in tiled mode
+TILE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Progressive extraction previews contours from an edge map this fraction
+# of the drawing's size, simplified with this RDP epsilon (drawing px)
+PREVIEW_SCALE = 0.5
+PREVIEW_EPSILON = 2.0
+
+# Most characters of motor commands sent to the firmware in one chunk
+MOTCTL_CHUNK_MAX_CHARS = 10_000
+
 
 def calculate_image_new_dimen(cv_img, arm_max_length) -> tuple[int, int]:
     """Returns the new width and height for an image given an arm maximum
@@ -39,189 +147,1028 @@ def calculate_image_new_dimen(cv_img, arm_max_length) -> tuple[int, int]:
 def extract_contours(
         opencv_image,
         new_dimensions,
-        initial_detail_level: float | None = None):
+        initial_detail_level: float | None = None,
+        smoothing_workers: int | None = None,
+        cache: ContourCache | None = None,
+        mode: str = "canny",
+        on_update=None,
+        tile_size: int | None = None,
+        preset: str = "quality",
+        deadline_ms: float | None = None,
+        noise_suppression: dict | None = None,
+        return_report: bool = False):
     """Filter image and extract simplified and smooth contours using RDP and
-    B-splines."""
-
-    # Calculate image contrast
-    constrast = _normalized_histogram_contrast(opencv_image)
+    B-splines. Contours are smoothed across smoothing_workers processes
+    (defaults to SMOOTHING_WORKERS). If a cache is given, contours already
+    extracted from the same image with the same parameters are loaded from
+    it instead. The mode is "canny" for edge outlines or "skeleton" for
+    stroke centerlines (see ExtractionPipeline).
+
+    If on_update is given, extraction is progressive: a coarse preview is
+    returned straight away and the contours are refined in the background,
+    with on_update(contours, final) called for each refinement until the
+    full quality contours are ready (see ProgressiveExtractor). A new
+    progressive extraction cancels the refinement still running. A cache,
+    deadline_ms and return_report can't be used with on_update.
+
+    If tile_size is given, edges and contours are extracted in tiles of
+    that size in parallel (see ExtractionPipeline), which is faster for
+    large drawings.
+
+    The preset is one of EXTRACTION_PRESETS. If deadline_ms is given, the
+    best preset that the cost model predicts will finish within it is
+    used instead (see select_preset). If return_report is True a
+    (contours, report) tuple is returned, where the report holds the
+    preset, the extraction parameters, the predicted time (if there was a
+    deadline) and the wall time in seconds.
+
+    Noise is suppressed before edge detection with the preset's settings
+    (see NOISE_SUPPRESSION), which noise_suppression can override, e.g.
+    {"bilateral": None} to skip the bilateral filter."""
+    if on_update is not None:
+        unsupported = [
+            name for name, is_given in (
+                ("cache", cache is not None),
+                ("deadline_ms", deadline_ms is not None),
+                ("return_report", return_report),
+            )
+            if is_given
+        ]
+        if unsupported:
+            raise ValueError("Progressive extraction does not support "
+                             f"{', '.join(unsupported)}")
+        return _progressive_extractor.request(
+            opencv_image,
+            new_dimensions,
+            on_update,
+            detail_level=initial_detail_level,
+            smoothing_workers=smoothing_workers,
+            mode=mode,
+            tile_size=tile_size,
+            preset=preset,
+            noise_suppression=noise_suppression
+        )
 
-    # Convert the image to grayscale
-    img = cv2.cvtColor(opencv_image, cv2.COLOR_RGB2GRAY)
+    start_time = time.perf_counter()
+    # With a deadline the preset is chosen by measuring the image with the
+    # quality preset's stages
+    pipeline = ExtractionPipeline(
+        opencv_image, mode=mode, tile_size=tile_size,
+        preset=preset if deadline_ms is None else "quality",
+        noise_suppression=noise_suppression
+    )
+    predicted_time = None
+
+    def make_report(detail_level) -> dict:
+        report = {
+            "preset": pipeline.preset,
+            "parameters": _detail_parameters(detail_level, pipeline.settings),
+            "predicted_time": predicted_time,
+            "wall_time": time.perf_counter() - start_time,
+        }
+        print(f"Extracted contours with the {report['preset']} preset in "
+              f"{report['wall_time'] * 1000:.0f} ms")
+        for name, value in report["parameters"].items():
+            print(f"\t{name}={value}")
+        return report
+
+    # The cache is keyed on the requested preset or deadline, so a hit
+    # skips measuring the image to choose a preset too
+    if cache is not None:
+        key = cache.make_key(
+            opencv_image,
+            function="extract_contours",
+            new_dimensions=tuple(new_dimensions),
+            detail_level=initial_detail_level,
+            mode=mode,
+            tile_size=tile_size,
+            deadline_ms=deadline_ms,
+            settings=pipeline.settings
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            contours, extras = cached
+            if not return_report:
+                return contours
+            if "detail_level" in extras and "preset" in extras:
+                pipeline = ExtractionPipeline(
+                    opencv_image, mode=mode, tile_size=tile_size,
+                    preset=extras["preset"],
+                    noise_suppression=noise_suppression
+                )
+                predicted_time = extras.get("predicted_time")
+                return contours, make_report(extras["detail_level"])
+
+    if deadline_ms is not None:
+        chosen_preset, predicted_time = select_preset(
+            pipeline,
+            new_dimensions,
+            deadline_ms / 1000 - (time.perf_counter() - start_time),
+            detail_level=initial_detail_level
+        )
+        if chosen_preset != pipeline.preset:
+            pipeline = ExtractionPipeline(
+                opencv_image, mode=mode, tile_size=tile_size,
+                preset=chosen_preset, noise_suppression=noise_suppression
+            )
 
-    # First rotation (make landscape) for optimal semicircle coverage
-    img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    detail_level = initial_detail_level
+    if detail_level is None:
+        detail_level = pipeline.detail_level(new_dimensions)
+    contours = pipeline.run(
+        new_dimensions,
+        detail_level=detail_level,
+        smoothing_workers=smoothing_workers
+    )
 
-    # Resize image
-    img = cv2.resize(img, new_dimensions)
+    if cache is not None:
+        extras = {"detail_level": detail_level, "preset": pipeline.preset}
+        if predicted_time is not None:
+            extras["predicted_time"] = predicted_time
+        cache.put(key, contours, **extras)
+    if return_report:
+        return contours, make_report(detail_level)
+    return contours
 
-    # This second rotation compensates for the screen Y coord corresponding to
-    # the arm's X coord. IMPORTANT!!!
-    img = cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
 
-    # Edge detection
-    edge_det_threshold = _interpolate_threshold(
-        EDGE_DET_THRESH_NARROW,
-        EDGE_DET_THRESH_WIDE,
-        k=constrast
+def select_preset(
+        pipeline: "ExtractionPipeline",
+        new_dimensions,
+        time_budget: float,
+        detail_level: float | None = None) -> tuple[str, float]:
+    """
+    Chooses the best extraction preset that the cost model predicts will
+    finish within the time budget (seconds), or "draft" if none will.
+    Returns the preset and its predicted extraction time in seconds.
+
+    The cost model (EXTRACTION_COST_MODEL) predicts the time of each
+    preset from the number of raw contour points and the detail level,
+    which are measured with the given pipeline's stages. It was fitted on
+    the bundled sample images by the calibrate_presets benchmark.
+    """
+    point_count = sum(
+        len(contour) for contour in pipeline.raw_contours(new_dimensions)
     )
-    edges = cv2.Canny(img, *edge_det_threshold)
-
-    # Compute detail level (between 0 and 1)
-    if initial_detail_level is None:
-        detail_level = calculate_image_detail_level(
-            edges,
-            min_variance=1_000,
-            max_variance=50_000
+    if detail_level is None:
+        detail_level = pipeline.detail_level(new_dimensions)
+    detail_level = float(np.clip(detail_level, 0, 1))
+
+    for preset in EXTRACTION_PRESETS:
+        intercept, per_point, per_detail_point = EXTRACTION_COST_MODEL[preset]
+        predicted_time = (
+            intercept
+            + per_point * point_count
+            + per_detail_point * point_count * detail_level
+        ) / 1000
+        if predicted_time <= time_budget or preset == "draft":
+            return preset, predicted_time
+    raise ValueError("EXTRACTION_PRESETS has no draft preset")
+
+
+class ExtractionPipeline:
+    """
+    Contour extraction for a single image, split into explicit stages:
+    preprocess, denoise, edges, raw contours and filter/smooth.
+
+    The output of each stage is memoized on that stage's inputs, so running
+    the pipeline again with a new detail level only reruns the stages that
+    depend on it.
+
+    In "canny" mode the raw contours are the outlines of the Canny edge
+    map. In "skeleton" mode they are the traced centerlines of the image's
+    dark strokes, so line art is drawn once instead of along both edges.
+
+    Raw contours that another contour already covers within the dedupe
+    tolerance (image pixels, which are mm at the drawing's size) are
+    removed before smoothing. A tolerance of None keeps every contour.
+
+    The preset (see EXTRACTION_PRESETS) sets the edge thresholds, the
+    ranges the detail level interpolates the smoothing parameters within,
+    and the dedupe tolerance and coverage if it changes them. Any of these
+    settings can be overridden on top of the preset with a settings dict
+    keyed like the presets. A noise_suppression entry in it only updates
+    the preset's noise suppression settings.
+
+    Before edge detection the image is smoothed and despeckled, and edge
+    components too small to draw are removed from the edge map, with the
+    preset's noise suppression settings updated with noise_suppression
+    (see noise_suppression.NOISE_SUPPRESSION).
+
+    If tile_size is given, the Canny edge map is detected and its contours
+    traced in tiles of that size across tile_workers threads (defaults to
+    TILE_WORKERS), and contours that cross tile borders are stitched back
+    together (see tiled_extraction). The contours cover the untiled ones
+    to within a pixel, but may start at other points and be split or
+    joined differently where they cross tile borders.
+    """
+    def __init__(
+            self,
+            opencv_image,
+            mode: str = "canny",
+            dedupe_tolerance: float | None = DEDUPE_TOLERANCE,
+            tile_size: int | None = None,
+            tile_workers: int | None = None,
+            preset: str = "quality",
+            noise_suppression: dict | None = None,
+            settings: dict | None = None):
+        if mode not in EXTRACTION_MODES:
+            raise ValueError(f"Unknown contour extraction mode: '{mode}'")
+        if preset not in EXTRACTION_PRESETS:
+            raise ValueError(f"Unknown contour extraction preset: '{preset}'")
+        self.opencv_image = opencv_image
+        self.mode = mode
+        self.preset = preset
+        settings = dict(settings or {})
+        overrides = {**EXTRACTION_PRESETS[preset], **settings}
+        self.settings = {**_extraction_settings(preset), **overrides}
+        # Noise suppression overrides update the preset's, rather than
+        # replacing them
+        self.settings["noise_suppression"] = {
+            **_extraction_settings(preset)["noise_suppression"],
+            **settings.get("noise_suppression", {}),
+            **(noise_suppression or {}),
+        }
+        self.dedupe_coverage = DEDUPE_COVERAGE
+        if "dedupe" in overrides:
+            dedupe_tolerance, self.dedupe_coverage = (
+                self.settings["dedupe"] or (None, DEDUPE_COVERAGE)
+            )
+        self.dedupe_tolerance = dedupe_tolerance
+        self.tile_size = tile_size
+        self.tile_workers = (
+            TILE_WORKERS if tile_workers is None else tile_workers
+        )
+        self._memo: dict[tuple, object] = {}
+
+    def _memoized(self, key: tuple, compute):
+        # Returns the memoized output for the key, computing it if needed.
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def contrast(self) -> float:
+        """Normalized histogram contrast of the image (between 0 and 1)."""
+        return self._memoized(
+            ("contrast",),
+            lambda: _normalized_histogram_contrast(
+                _analysis_image(self.opencv_image)
+            )
         )
-    elif not 0 <= initial_detail_level <= 1:
-        detail_level: float = np.clip(initial_detail_level, 0, 1)
-    else:
-        detail_level = initial_detail_level
 
-    min_cont_points_ignore = _interpolate_value(
-        MIN_CONT_PTS_IGNORE_RANGE,
-        k=detail_level,
-    )
-    min_cont_points_smooth = _interpolate_value(
-        MIN_CONT_PTS_SMOOTH_RANGE,
-        k=detail_level,
-    )
-    linscape_threshold = _interpolate_threshold(
-        LINSCAPE_THRESH_NARROW,
-        LINSCAPE_THRESH_WIDE,
-        k=detail_level
-    )
-    epsilon = _interpolate_value(EPSILON_RANGE, k=detail_level)
-    smoothness = _interpolate_value(SMOOTHNESS_RANGE, k=detail_level)
+    def preprocess(self, new_dimensions):
+        """Grayscale, rotated and resized image."""
+        def compute():
+            # Convert the image to grayscale
+            img = cv2.cvtColor(self.opencv_image, cv2.COLOR_RGB2GRAY)
 
-    # Find contours
-    contours, _ = cv2.findContours(
-        image=edges,
-        mode=cv2.RETR_TREE,
-        method=cv2.CHAIN_APPROX_SIMPLE
-    )
+            # First rotation (make landscape) for optimal semicircle coverage
+            img = cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
 
-    # Debug
-    print(f"Contours extracted. Contour count: {len(contours)}")
-    print(f'''
-        {constrast=}
-        {min_cont_points_ignore=}
-        {min_cont_points_smooth=}
-        {linscape_threshold=}
-        {epsilon=}
-        {smoothness=}
-        {detail_level=}
-    ''')
-
-    return _get_smoothed_contours(
-        contours,
-        int(min_cont_points_ignore),
-        int(min_cont_points_smooth),
-        linscape_threshold,
-        epsilon,
-        smoothness
-    )
+            # Resize image
+            img = cv2.resize(img, new_dimensions)
 
+            # This second rotation compensates for the screen Y coord
+            # corresponding to the arm's X coord. IMPORTANT!!!
+            return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
 
-def sort_contours(contours: list):
-    """Sort contours to minimize pen travel (greedy nearest neighbor)."""
-    sorted_contours = [contours.pop(0)]  # Start with first contour
-    contour_index = 0
+        return self._memoized(
+            ("preprocess", tuple(new_dimensions)), compute
+        )
 
-    while contours:
-        last_point = sorted_contours[-1][-1]  # Last point of last contour
-        # Find the closest next contour
-        next_index = min(
-            range(len(contours)),
-            key=lambda i: distance.euclidean(last_point, contours[i][0])
+    def denoised(self, new_dimensions):
+        """Preprocessed image with its noise suppressed."""
+        settings = self.settings["noise_suppression"]
+        return self._memoized(
+            ("denoised", tuple(new_dimensions)),
+            lambda: suppress_noise(
+                self.preprocess(new_dimensions),
+                bilateral=settings["bilateral"],
+                morphology=settings["morphology"]
+            )
         )
-        sorted_contours.append(contours.pop(next_index))
-        contour_index += 1
 
-    return sorted_contours
+    def edges(self, new_dimensions):
+        """Canny edge map of the denoised image with thresholds chosen
+        from the image contrast, without small edge components."""
+        def compute():
+            thresh_wide, thresh_narrow = self.settings["edge_det_thresh"]
+            edge_det_threshold = _interpolate_threshold(
+                thresh_narrow,
+                thresh_wide,
+                k=self.contrast()
+            )
+            if self.tile_size is not None:
+                edges = tiled_canny(
+                    self.denoised(new_dimensions),
+                    edge_det_threshold,
+                    tile_size=self.tile_size,
+                    workers=self.tile_workers
+                )
+            else:
+                edges = cv2.Canny(
+                    self.denoised(new_dimensions), *edge_det_threshold
+                )
+            return remove_small_edges(
+                edges, self.settings["noise_suppression"]["min_edge_pixels"]
+            )
+
+        return self._memoized(("edges", tuple(new_dimensions)), compute)
+
+    def raw_contours(self, new_dimensions):
+        """Unsmoothed contours of the edge map (only the contours are
+        retrieved, no hierarchy is built), or the skeleton centerlines in
+        skeleton mode."""
+        return self._raw_contours(new_dimensions)[0]
+
+    def raw_closed(self, new_dimensions):
+        """Whether each raw contour is a closed loop. Edge map outlines
+        always are, skeleton centerlines are if they are loops."""
+        return self._raw_contours(new_dimensions)[1]
+
+    def _raw_contours(self, new_dimensions):
+        # Raw contours and their closed flags.
+        def compute():
+            if self.mode == "skeleton":
+                return extract_centerlines(
+                    self.denoised(new_dimensions), return_closed=True
+                )
+            if self.tile_size is not None:
+                return tiled_find_contours(
+                    self.edges(new_dimensions),
+                    tile_size=self.tile_size,
+                    workers=self.tile_workers,
+                    return_closed=True
+                )
+            contours, _ = cv2.findContours(
+                image=self.edges(new_dimensions),
+                mode=cv2.RETR_LIST,
+                method=cv2.CHAIN_APPROX_SIMPLE
+            )
+            return contours, [True] * len(contours)
+
+        return self._memoized(
+            ("raw_contours", tuple(new_dimensions)), compute
+        )
+
+    def deduped_contours(self, new_dimensions):
+        """Raw contours without duplicate and nested near-identical
+        contours."""
+        return self._deduped_contours(new_dimensions)[0]
+
+    def deduped_closed(self, new_dimensions):
+        """Whether each deduped contour is a closed loop."""
+        return self._deduped_contours(new_dimensions)[1]
+
+    def _deduped_contours(self, new_dimensions):
+        # Deduped raw contours and their closed flags.
+        def compute():
+            raw_contours = self.raw_contours(new_dimensions)
+            closed = self.raw_closed(new_dimensions)
+            if self.dedupe_tolerance is None:
+                return raw_contours, closed
+            contours, report = remove_duplicate_contours(
+                raw_contours,
+                tolerance=self.dedupe_tolerance,
+                coverage=self.dedupe_coverage,
+                return_report=True
+            )
+            return contours, [
+                is_closed
+                for is_closed, is_kept in zip(closed, report["kept"])
+                if is_kept
+            ]
+
+        return self._memoized(
+            ("deduped_contours", tuple(new_dimensions)), compute
+        )
+
+    def features(self, new_dimensions) -> dict:
+        """Feature table of the deduped raw contours (see
+        contour_features). Smoothing takes each contour's spline degree
+        from it, and the rest is for debugging and tuning."""
+        return self._memoized(
+            ("features", tuple(new_dimensions)),
+            lambda: contour_features(self.deduped_contours(new_dimensions))
+        )
+
+    def detail_level(self, new_dimensions) -> float:
+        """Detail level (between 0 and 1) calculated from the edge map."""
+        return self._memoized(
+            ("detail_level", tuple(new_dimensions)),
+            lambda: calculate_image_detail_level(
+                self.edges(new_dimensions),
+                min_variance=1_000,
+                max_variance=50_000
+            )
+        )
+
+    def smoothed_contours(
+            self,
+            new_dimensions,
+            detail_level: float,
+            smoothing_workers: int | None = None) -> ContourSet:
+        """Filtered, simplified and smoothed contours for a detail level."""
+        params = _detail_parameters(detail_level, self.settings)
+
+        def compute():
+            raw_contours = self.deduped_contours(new_dimensions)
+
+            # Debug
+            print("Contours extracted. "
+                  f"Contour count: {len(raw_contours)}")
+            print(f"\tcontrast={self.contrast()}")
+            for name, value in params.items():
+                print(f"\t{name}={value}")
+
+            return _get_smoothed_contours(
+                raw_contours,
+                int(params["min_cont_points_ignore"]),
+                int(params["min_cont_points_smooth"]),
+                params["linscape_threshold"],
+                params["epsilon"],
+                params["smoothness"],
+                workers=smoothing_workers,
+                spline_degrees=self.features(new_dimensions)["spline_degree"],
+                closed=self.deduped_closed(new_dimensions)
+            )
+
+        key = ("smoothed_contours", tuple(new_dimensions),
+               tuple(params.values()))
+        # The ContourSet's points are read-only, so sharing it is safe
+        return self._memoized(key, compute)
+
+    def run(
+            self,
+            new_dimensions,
+            detail_level: float | None = None,
+            smoothing_workers: int | None = None) -> ContourSet:
+        """Runs every stage of the pipeline and returns the smoothed
+        contours. The detail level is calculated from the image if it is
+        not given."""
+        if detail_level is None:
+            detail_level = self.detail_level(new_dimensions)
+        return self.smoothed_contours(
+            new_dimensions, detail_level, smoothing_workers
+        )
+
+
+class ProgressiveExtractor:
+    """
+    Coarse-to-fine contour extraction for interactive tuning.
+
+    A request returns a preview at once: the contours of an edge map
+    PREVIEW_SCALE times the drawing's size, simplified with RDP at
+    PREVIEW_EPSILON and scaled back up, without smoothing. A background
+    thread then extracts the full size contours, first only simplified and
+    then smoothed, and passes each to the request's on_update(contours,
+    final) callback. The latest result is also kept in `latest` as a
+    (contours, final) tuple, for pages that poll from their update loop.
+
+    Each request cancels the refinement of the previous one, which stops
+    after the stage it is running and never calls its callback again.
+    Requests for the same image reuse its memoized pipeline stages, so
+    moving a detail slider only reruns smoothing.
+    """
+    def __init__(
+            self,
+            preview_scale: float = PREVIEW_SCALE,
+            preview_epsilon: float = PREVIEW_EPSILON):
+        self.preview_scale = preview_scale
+        self.preview_epsilon = preview_epsilon
+        self.latest: tuple[ContourSet, bool] | None = None
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._pipeline: ExtractionPipeline | None = None
+        self._pipeline_args: dict = {}
+
+    def _get_pipeline(
+            self, opencv_image, **pipeline_args) -> ExtractionPipeline:
+        # Reuses the previous request's pipeline if it is for the same image
+        # with the same arguments
+        pipeline = self._pipeline
+        if (pipeline is None or pipeline.opencv_image is not opencv_image
+                or self._pipeline_args != pipeline_args):
+            pipeline = ExtractionPipeline(opencv_image, **pipeline_args)
+            self._pipeline = pipeline
+            self._pipeline_args = pipeline_args
+        return pipeline
+
+    def request(
+            self,
+            opencv_image,
+            new_dimensions,
+            on_update,
+            detail_level: float | None = None,
+            smoothing_workers: int | None = None,
+            mode: str = "canny",
+            tile_size: int | None = None,
+            preset: str = "quality",
+            noise_suppression: dict | None = None) -> ContourSet:
+        """Cancels the refinement in progress, returns the preview contours
+        and starts refining them in the background. The mode, tile size,
+        preset and noise suppression are passed to the ExtractionPipeline
+        (see ExtractionPipeline)."""
+        with self._lock:
+            self._cancelled.set()
+            cancelled = self._cancelled = threading.Event()
+            pipeline = self._get_pipeline(
+                opencv_image,
+                mode=mode,
+                tile_size=tile_size,
+                preset=preset,
+                noise_suppression=noise_suppression
+            )
+
+        new_dimensions = tuple(new_dimensions)
+        preview = self._preview(pipeline, new_dimensions)
+        self._publish(preview, False, cancelled, None)
+
+        def refine():
+            raw_contours = pipeline.deduped_contours(new_dimensions)
+            closed = pipeline.deduped_closed(new_dimensions)
+            if cancelled.is_set():
+                return
+            level = detail_level
+            if level is None:
+                level = pipeline.detail_level(new_dimensions)
+            epsilon = _detail_parameters(level, pipeline.settings)["epsilon"]
+            self._publish(
+                ContourSet.from_contours(_rdp_batch(
+                    [contour.reshape(-1, 2) for contour in raw_contours],
+                    epsilon=epsilon
+                ), closed),
+                False, cancelled, on_update
+            )
+            if cancelled.is_set():
+                return
+            self._publish(
+                pipeline.run(new_dimensions, level, smoothing_workers),
+                True, cancelled, on_update
+            )
+
+        threading.Thread(target=refine, daemon=True).start()
+        return preview
+
+    def cancel(self) -> None:
+        """Cancels the refinement in progress."""
+        with self._lock:
+            self._cancelled.set()
+
+    def _preview(self, pipeline: ExtractionPipeline, new_dimensions):
+        # Coarse contours from a downsampled edge map, in drawing pixels.
+        width, height = new_dimensions
+        preview_dimensions = (
+            max(1, round(width * self.preview_scale)),
+            max(1, round(height * self.preview_scale))
+        )
+        min_points = pipeline.settings["min_cont_pts_ignore_range"][0]
+        raw_contours, closed = [], []
+        for contour, is_closed in zip(
+                pipeline.raw_contours(preview_dimensions),
+                pipeline.raw_closed(preview_dimensions)):
+            if len(contour) > min_points:
+                raw_contours.append(contour.reshape(-1, 2))
+                closed.append(is_closed)
+        contours = ContourSet.from_contours(_rdp_batch(
+            raw_contours, epsilon=self.preview_epsilon * self.preview_scale
+        ), closed)
+        scale = (width / preview_dimensions[0],
+                 height / preview_dimensions[1])
+        return ContourSet(contours.points * scale, contours.offsets,
+                          contours.closed)
+
+    def _publish(self, contours, final: bool, cancelled, on_update) -> None:
+        # Records and reports a result unless its request was cancelled.
+        with self._lock:
+            if cancelled.is_set():
+                return
+            self.latest = (contours, final)
+        if on_update is not None:
+            on_update(contours, final)
+
+
+_progressive_extractor = ProgressiveExtractor()
+
+
+def _extraction_settings(preset: str = "quality") -> dict:
+    # Module level constants that change the extracted contours, with the
+    # preset's overrides.
+    settings = {
+        "edge_det_thresh": (EDGE_DET_THRESH_WIDE, EDGE_DET_THRESH_NARROW),
+        "linscape_thresh": (LINSCAPE_THRESH_WIDE, LINSCAPE_THRESH_NARROW),
+        "min_cont_pts_ignore_range": MIN_CONT_PTS_IGNORE_RANGE,
+        "min_cont_pts_smooth_range": MIN_CONT_PTS_SMOOTH_RANGE,
+        "epsilon_range": EPSILON_RANGE,
+        "smoothness_range": SMOOTHNESS_RANGE,
+        "dedupe": (DEDUPE_TOLERANCE, DEDUPE_COVERAGE),
+        "noise_suppression": NOISE_SUPPRESSION,
+    }
+    settings.update(EXTRACTION_PRESETS[preset])
+    return settings
+
+
+def _detail_parameters(detail_level: float, settings=None) -> dict:
+    # Interpolates the extraction parameters that depend on the detail level
+    # within the settings' ranges (defaults to the quality preset).
+    if settings is None:
+        settings = _extraction_settings()
+    detail_level = float(np.clip(detail_level, 0, 1))
+    linscape_wide, linscape_narrow = settings["linscape_thresh"]
+    return {
+        "detail_level": detail_level,
+        "min_cont_points_ignore": _interpolate_value(
+            settings["min_cont_pts_ignore_range"],
+            k=detail_level,
+        ),
+        "min_cont_points_smooth": _interpolate_value(
+            settings["min_cont_pts_smooth_range"],
+            k=detail_level,
+        ),
+        "linscape_threshold": _interpolate_threshold(
+            linscape_narrow,
+            linscape_wide,
+            k=detail_level
+        ),
+        "epsilon": _interpolate_value(
+            settings["epsilon_range"], k=detail_level
+        ),
+        "smoothness": _interpolate_value(
+            settings["smoothness_range"], k=detail_level
+        ),
+    }
+
+
+def sort_contours(
+        contours, start=None, mode: str = "greedy", closed=None) -> list:
+    """Sort contours to minimize pen travel. The "greedy" mode is nearest
+    neighbour over both ends of open contours and every point of closed
+    loops (see contour_ordering.order_contours), which are rotated to start
+    there and closed. The "hilbert" mode orders contours along a Hilbert
+    curve, which is faster for very large contour sets but leaves more pen
+    travel. Contours are closed loops where closed (one bool per contour)
+    says so, which defaults to the closed flags of a ContourSet."""
+    if closed is None:
+        closed = getattr(contours, "closed", None)
+    if mode == "hilbert":
+        return hilbert_order_contours(contours, start=start)
+    if mode == "greedy":
+        return order_contours(contours, start=start, closed=closed)
+    raise ValueError(f"Unknown contour sorting mode: '{mode}'")
 
 
 def save_motor_angles(
         contours,
         base, arm1, arm2, offset, pen_up_offset,
         output_file="data/output.motctl",
-        scale=1.0) -> None:
+        scale=1.0,
+        lift_threshold: float = PEN_LIFT_THRESHOLD,
+        step_tolerance: float | None = STEP_TOLERANCE) -> dict[str, int]:
     """
     Converts contours to motor angles to be interpreted by the robot arm's
     firmware.
+
+    The pen is only lifted between contours when the hop from the end of
+    one contour to the start of the next is at least lift_threshold (mm),
+    shorter hops are drawn with the pen down. Returns a job summary of the
+    pen lifts made and avoided and the number of lines written, which is
+    also printed.
+
+    Strokes are clipped to the part of the paper the arm can reach (see
+    workspace_clipping), split where they leave it, so no unreachable
+    point is written.
+
+    Each stroke is resampled in motor step space so that moving the motors
+    in a straight line between consecutive commands never strays more than
+    step_tolerance steps from the stroke, using as few commands as
+    possible. Moves of less than a step are dropped. If step_tolerance is
+    None, every point of every contour is written.
     """
+    commands, strokes, pen_lifts_avoided = _motor_commands(
+        contours, base, arm1, arm2, offset, pen_up_offset,
+        scale, lift_threshold, step_tolerance
+    )
+    lines = [_make_cmd_line(steps) for steps in commands]
 
-    def make_cmd_line_from_point(x, y, z, scale):
-        angles = get_real_angles(px, py, pz, base, arm1, arm2)
-        if angles:
-            print(
-                f'@{angles["x"]} {angles["y"]} '
-                f'{angles["z"]} {angles["a"]}'
-            )
-            ax = deg_to_steps(angles["x"])
-            ay = deg_to_steps(angles["y"])
-            az = deg_to_steps(angles["z"])
-            aa = deg_to_steps(angles["a"])
-            line = f"@{ax} {ay} {az} {aa}"
-        else:
-            line = "NO ANGLES"
-        return line
+    chunks = _chunk_lines(lines)
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.writelines(line + "\n" for chunk in chunks for line in chunk)
+        f.write("DONE\n")  # End all chunks
+
+    summary = {
+        "pen_lifts": len(strokes),
+        "pen_lifts_avoided": pen_lifts_avoided,
+        "lines": len(lines),
+        "chunks": len(chunks),
+    }
+    print(f"Saved {summary['lines']} moves in {summary['chunks']} chunk(s) "
+          f"with {summary['pen_lifts']} pen lift(s), "
+          f"{summary['pen_lifts_avoided']} avoided")
+    return summary
+
+
+def estimate_drawing_time(
+        contours,
+        base, arm1, arm2, offset, pen_up_offset,
+        scale=1.0,
+        lift_threshold: float = PEN_LIFT_THRESHOLD,
+        step_tolerance: float | None = STEP_TOLERANCE) -> dict:
+    """
+    Estimates how long the arm takes to draw contours, from the motor
+    commands save_motor_angles would write for them (same arguments).
+
+    Every command moves each motor from its last position (starting at the
+    origin) with a trapezoidal speed profile, using the speeds and
+    acceleration in motor_controller.ino, and takes as long as the slowest
+    motor. The firmware echoes each command over serial, so a command never
+    takes less than the time to send the echo. The time to send the motctl
+    file to the firmware is added on.
+
+    Returns a dict of the estimated duration, move and transfer times (s),
+    pen-down length and pen-up travel (mm), pen lifts, moves and the size
+    of the motctl file (bytes).
+    """
+    commands, strokes, _ = _motor_commands(
+        contours, base, arm1, arm2, offset, pen_up_offset,
+        scale, lift_threshold, step_tolerance
+    )
 
+    # Unreachable points are rejected by the firmware and don't move it
+    steps = np.array(
+        [steps for steps in commands if steps is not None], dtype=np.int64
+    ).reshape(-1, 4)
+    deltas = np.abs(np.diff(steps, axis=0, prepend=np.zeros((1, 4))))
+    echo_time = FIRMWARE_ECHO_CHARS * 10 / FIRMWARE_BAUD_RATE
+    move_times = np.maximum(_move_durations(deltas), echo_time)
+
+    motctl_chars = sum(
+        len(line) + 1
+        for chunk in _chunk_lines([_make_cmd_line(c) for c in commands])
+        for line in chunk
+    ) + len("DONE\n")
+    transfer_time = motctl_chars * 10 / FIRMWARE_BAUD_RATE
+
+    pen_down_length = sum(
+        float(np.linalg.norm(np.diff(stroke, axis=0), axis=1).sum())
+        for stroke in strokes
+    )
+    pen_up_travel = sum(
+        float(np.linalg.norm(start[0] - end[-1]))
+        for end, start in zip(strokes, strokes[1:])
+    )
+    return {
+        "duration": float(move_times.sum()) + transfer_time,
+        "move_time": float(move_times.sum()),
+        "transfer_time": transfer_time,
+        "pen_down_length": pen_down_length,
+        "pen_up_travel": pen_up_travel,
+        "pen_lifts": len(strokes),
+        "moves": len(steps),
+        "motctl_bytes": motctl_chars,
+    }
+
+
+def pen_lift_gap(
+        base, arm1, arm2, offset, pen_up_offset,
+        scale=1.0,
+        length: float = 20.0) -> float:
+    """
+    Shortest run (in contour units) that is quicker to lift the pen over
+    than to draw, from estimate_drawing_time (same arguments): the time a
+    pen lift adds, over the time drawing a straight line of the given
+    length from the drawing's origin takes per unit of length. This is
+    remove_overdraw's min_gap for the arm.
+    """
+    def duration(strokes) -> float:
+        return estimate_drawing_time(
+            strokes, base, arm1, arm2, offset, pen_up_offset,
+            scale=scale, lift_threshold=0.0
+        )["duration"]
+
+    half = np.array([[0.0, 0.0], [length, 0.0]])
+    line = np.array([[0.0, 0.0], [2 * length, 0.0]])
+    lift_time = duration([half, half + [length, 0.0]]) - duration([line])
+    time_per_unit = (duration([line]) - duration([half])) / length
+    return lift_time / time_per_unit
+
+
+def drawing_time_estimator(
+        base, arm1, arm2, offset, pen_up_offset,
+        scale=1.0,
+        lift_threshold: float = PEN_LIFT_THRESHOLD):
+    """Returns a function that estimates the drawing time (s) of extracted
+    contours after stitching, ordering and trimming overdraw from them (see
+    estimate_drawing_time), for extract_and_refine_contour_count's
+    target_duration. The arguments it was made with are in its parameters
+    attribute, which the contour cache keys on."""
+    min_gap = pen_lift_gap(base, arm1, arm2, offset, pen_up_offset, scale)
+
+    def estimate(contours) -> float:
+        strokes = remove_overdraw(
+            sort_contours(stitch_contours(contours)), min_gap=min_gap
+        )
+        return estimate_drawing_time(
+            strokes, base, arm1, arm2, offset, pen_up_offset,
+            scale=scale, lift_threshold=lift_threshold
+        )["duration"]
+    estimate.parameters = {
+        "base": base,
+        "arm1": arm1,
+        "arm2": arm2,
+        "offset": tuple(offset),
+        "pen_up_offset": pen_up_offset,
+        "scale": scale,
+        "lift_threshold": lift_threshold,
+    }
+    return estimate
+
+
+def _motor_commands(
+        contours,
+        base, arm1, arm2, offset, pen_up_offset,
+        scale, lift_threshold: float, step_tolerance: float | None):
+    # Motor steps of every command written for the contours (None for
+    # unreachable points), with the strokes drawn and the number of pen
+    # lifts avoided. Every point is converted to steps in one batch.
+    def points_steps(points, z):
+        points = np.column_stack((points, np.full(len(points), z)))
+        return get_steps_batch(points, base, arm1, arm2)
+
+    strokes, pen_lifts_avoided = _plan_pen_lifts(
+        contours, offset, scale, lift_threshold
+    )
+
+    pz = offset[2]  # No scale for z, must be constant
+    pzu = offset[2] + pen_up_offset  # Up
+
+    # Clip the strokes to where the arm can reach with the pen up and down
+    strokes = clip_to_workspace(strokes, (pz, pzu), base, arm1, arm2)
+    if not strokes:
+        return [], strokes, pen_lifts_avoided
+
+    # Before drawing each stroke, we must put the pen up first before
+    # moving it into position
+    pen_up_commands = _step_commands(
+        *points_steps([stroke[0] for stroke in strokes], pzu)
+    )
+
+    if step_tolerance is None:
+        samples = strokes
+    else:
+        # The strokes are already scaled to mm
+        samples = [
+            _densify(stroke, STEP_RESAMPLE_SPACING) for stroke in strokes
+        ]
+    steps, reachable = points_steps(np.concatenate(samples), pz)
+    bounds = np.cumsum([len(stroke_samples) for stroke_samples in samples])
+    stroke_steps = np.split(steps, bounds[:-1])
+    stroke_reachable = np.split(reachable, bounds[:-1])
+    if step_tolerance is None:
+        stroke_commands = [
+            _step_commands(*stroke)
+            for stroke in zip(stroke_steps, stroke_reachable)
+        ]
+    else:
+        stroke_commands = _resample_in_step_space(
+            stroke_steps, stroke_reachable, step_tolerance
+        )
+
+    commands = []
+    for pen_up_command, drawn_commands in zip(
+            pen_up_commands, stroke_commands):
+        commands.append(pen_up_command)
+        commands.extend(drawn_commands)
+    return commands, strokes, pen_lifts_avoided
+
+
+def _step_commands(steps, reachable) -> list:
+    # Command steps as tuples, or None for the unreachable points.
+    return [
+        tuple(point_steps) if is_reachable else None
+        for point_steps, is_reachable in zip(
+            steps.tolist(), reachable.tolist())
+    ]
+
+
+def _make_cmd_line(steps) -> str:
+    # Motctl command line to move the motors to the given steps.
+    if steps is None:
+        return "NO ANGLES"
+    return "@{} {} {} {}".format(*steps)
+
+
+def _move_durations(deltas):
+    # Time (s) of each move of the (n, 4) absolute step deltas, the longest
+    # of each motor's trapezoidal (or triangular, for short moves) speed
+    # profile from rest to rest.
+    speeds = np.asarray(MOTOR_MAX_SPEEDS, dtype=float)
+    accel = float(MOTOR_ACCELERATION)
+    cruise = deltas >= speeds ** 2 / accel
+    times = np.where(
+        cruise,
+        deltas / speeds + speeds / accel,
+        2 * np.sqrt(deltas / accel)
+    )
+    return times.max(axis=1) if len(times) else np.zeros(0)
+
+
+def _plan_pen_lifts(contours, offset, scale, lift_threshold: float):
+    # Converts contours to arm (x, y) coordinates and joins each contour
+    # onto the previous one when the hop between them is shorter than the
+    # threshold. Returns the strokes and the number of pen lifts avoided.
+    strokes = []
+    pen_lifts_avoided = 0
+    contours = ContourSet.from_contours(contours)
+    for points in contours.transformed(offset[:2], scale):
+        if not len(points):
+            continue
+        if (strokes and np.linalg.norm(points[0] - strokes[-1][-1])
+                < lift_threshold):
+            strokes[-1] = np.vstack((strokes[-1], points))
+            pen_lifts_avoided += 1
+        else:
+            strokes.append(points)
+    return strokes, pen_lifts_avoided
+
+
+def _resample_in_step_space(
+        stroke_steps, stroke_reachable, tolerance: float) -> list:
+    # Commands of the fewest points along each stroke that keep the
+    # straight joint space moves between them within the tolerance (steps)
+    # of the stroke, from the motor steps of points sampled densely along
+    # it. Points that don't change the steps are dropped before the rest
+    # are simplified with RDP in step space, every stroke in one batch.
+    # Runs of unreachable points become a single None.
+    runs = []
+    strokes_runs = []
+    for steps, reachable in zip(stroke_steps, stroke_reachable):
+        breaks = np.flatnonzero(np.diff(reachable)) + 1
+        stroke_runs = []
+        for run, run_reachable in zip(
+                np.split(steps.astype(np.int64), breaks),
+                np.split(reachable, breaks)):
+            if not run_reachable[0]:
+                stroke_runs.append(None)
+                continue
+            moved = np.r_[True, np.any(np.diff(run, axis=0) != 0, axis=1)]
+            stroke_runs.append(len(runs))
+            runs.append(run[moved])
+        strokes_runs.append(stroke_runs)
+
+    simplified = _rdp_batch(runs, tolerance, distances=_chord_distances)
+    resampled = []
+    for stroke_runs in strokes_runs:
+        commands = []
+        for run_index in stroke_runs:
+            if run_index is None:
+                commands.append(None)
+            else:
+                commands.extend(map(tuple, simplified[run_index].tolist()))
+        resampled.append(commands)
+    return resampled
+
+
+def _densify(points, spacing: float):
+    # Adds evenly spaced points along each segment of a polyline so no two
+    # consecutive points are more than the spacing apart.
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2:
+        return points
+    segments = np.diff(points, axis=0)
+    counts = np.maximum(
+        np.ceil(np.linalg.norm(segments, axis=1) / spacing), 1
+    ).astype(np.int64)
+    seg_ids = np.repeat(np.arange(len(segments)), counts)
+    fractions = (
+        np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    ) / counts[seg_ids]
+    dense = points[seg_ids] + fractions[:, None] * segments[seg_ids]
+    return np.vstack((dense, points[-1:]))
+
+
+def _chunk_lines(lines, max_chars: int = MOTCTL_CHUNK_MAX_CHARS):
+    # Splits command lines into chunks of about max_chars characters at
+    # most. Each chunk starts with the memory the firmware has to allocate
+    # for it ("&<bytes>") and its lines are wrapped in "^" and "$".
     chunks = []
     chunk_lines = []
-    with open(output_file, "w", encoding="utf-8") as f:
-        for contour_index, contour in enumerate(contours):
-            # Each chunk is ~10k characters max
-            for point_index, point in enumerate(contour):
-                # When reading the first point of the contour, we must put
-                # the pen up first before moving it into position
-                is_pen_up = bool(point_index == 0)
-
-                px = (point[0] + offset[0]) * scale
-                py = (point[1] + offset[1]) * scale
-                pz = offset[2]  # No scale for z, must be constant
-
-                # Duplicate the point as a pen up point
-                if is_pen_up:
-                    pzu = offset[2] + pen_up_offset  # Up
-                    pen_up_line = make_cmd_line_from_point(px, py, pzu, scale)
-                line = make_cmd_line_from_point(px, py, pz, scale)
-
-                # If we exceed 10k characters or we're on the last line
-                char_count = len("\n".join(chunk_lines))
-
-                """
-                print(contour_index == len(contours) - 1)
-                print(point_index == len(contour) - 1)
-                """
-
-                if (char_count + len(line) > 10_000
-                        or (contour_index == len(contours) - 1
-                            and point_index == len(contour) - 1)):
-                    # Mark memory, start, end
-                    chunk_lines.insert(0, "^")
-                    chunk_lines.append("$")
-
-                    mem_value = len("\n".join(chunk_lines)) + 1
-                    chunk_lines.insert(0, f"&{mem_value}")
-
-                    # Add current chunk lines buffer to the list of chunks
-                    chunks.append(chunk_lines.copy())
-
-                    print(chunk_lines)
-                    print(chunks)
-
-                    # Reset the buffer for the current line
-                    chunk_lines.clear()
-                else:
-                    if is_pen_up:
-                        chunk_lines.append(pen_up_line)
-                    chunk_lines.append(line)
-        chunk_lines.append("DONE")  # End all chunks
-
-        all_lines = [line + "\n" for chunk in chunks for line in chunk]
-        f.writelines(all_lines)
+    char_count = 0
+    for line in lines:
+        if chunk_lines and char_count + len(line) + 1 > max_chars:
+            chunks.append(chunk_lines)
+            chunk_lines, char_count = [], 0
+        chunk_lines.append(line)
+        char_count += len(line) + 1
+
+    if chunk_lines:
+        chunks.append(chunk_lines)
+
+    marked_chunks = []
+    for chunk_lines in chunks:
+        # Mark memory, start, end
+        chunk_lines = ["^", *chunk_lines, "$"]
+        mem_value = len("\n".join(chunk_lines)) + 1
+        marked_chunks.append([f"&{mem_value}", *chunk_lines])
+    return marked_chunks
 
 
 def test_extract_contours(cv_image, new_dimensions):
@@ -255,39 +1202,200 @@ def extract_and_refine_contour_count(
         detail_level_adaptation_step: float,
         min_contour_count: int,
         max_contour_count: int,
-        new_dimensions):
+        new_dimensions,
+        search_workers: int = 1,
+        return_report: bool = False,
+        cache: ContourCache | None = None,
+        mode: str = "canny",
+        target_duration: float | None = None,
+        estimate_duration=None,
+        duration_tolerance: float = DRAWING_TIME_TOLERANCE):
     """
-    Iteratively adapt the contour detail and recalculate contours if the
-    resultant contour count is too high or too low.
+    Search for a detail level whose contour count is within the given
+    bounds and return the contours extracted at that level.
+
+    If a target_duration (seconds) is given, the contour count bounds are
+    ignored and the search is for a detail level whose drawing time, as
+    estimated by estimate_duration(contours) (see drawing_time_estimator),
+    is at most the target and no more than duration_tolerance (a fraction
+    of the target) under it. If no level fits, the closest level under
+    the target is chosen, or the quickest if every level is over it.
+
+    The contour count changes monotonically with the detail level, so the
+    search first brackets the bounds between the initial detail level and
+    an extremity, then narrows the bracket until the count is within bounds
+    or the bracket is narrower than detail_level_adaptation_step.
+    search_workers candidate levels are extracted concurrently on a thread
+    pool each round (OpenCV releases the GIL).
+
+    If return_report is True a (contours, report) tuple is returned, where
+    the report holds the chosen detail level, the contour count, the
+    estimated drawing time (None without a target), the number of
+    extractions and the wall time in seconds.
+
+    If a cache is given, a previous result for the same image and
+    parameters is loaded from it and no extraction runs. With a target
+    duration, the parameters include those of the estimate_duration (its
+    parameters attribute, see drawing_time_estimator). The cache isn't
+    used for an estimate_duration without them. The mode is "canny" or
+    "skeleton" (see ExtractionPipeline).
     """
-
-    detail_level = calculate_image_detail_level(cv_image, 100, 400)
-
-    for _ in range(10):  # Keep it reasonable
-        contours = extract_contours(
+    start_time = time.perf_counter()
+    step = max(detail_level_adaptation_step, 1e-3)
+    estimator_parameters = None
+    if target_duration is not None:
+        if estimate_duration is None:
+            raise ValueError("A target duration needs an estimate_duration")
+        estimator_parameters = getattr(estimate_duration, "parameters", None)
+        if estimator_parameters is None:
+            cache = None  # What the drawing time depends on is unknown
+
+    if cache is not None:
+        key = cache.make_key(
             cv_image,
-            new_dimensions=new_dimensions,
-            initial_detail_level=detail_level
+            function="extract_and_refine_contour_count",
+            detail_level_adaptation_step=detail_level_adaptation_step,
+            min_contour_count=min_contour_count,
+            max_contour_count=max_contour_count,
+            new_dimensions=tuple(new_dimensions),
+            mode=mode,
+            target_duration=target_duration,
+            duration_tolerance=duration_tolerance,
+            estimator=estimator_parameters,
+            settings=_extraction_settings()
         )
-        new_detail_level = detail_level
-        if len(contours) > max_contour_count:
-            new_detail_level -= detail_level_adaptation_step
-        elif len(contours) < min_contour_count:
-            new_detail_level += detail_level_adaptation_step
-
-        # If the countour count is within bounds or if the detail is at
-        # an extremity, then do not recalculate contours as we cannot
-        # further tweak the detail level.
-        if new_detail_level == detail_level or not 0 <= new_detail_level >= 1:
-            break
+        cached = cache.get(key)
+        if cached is not None:
+            contours, extras = cached
+            report = {
+                "detail_level": extras["detail_level"],
+                "contour_count": len(contours),
+                "drawing_time": extras.get("drawing_time"),
+                "extractions": 0,
+                "wall_time": time.perf_counter() - start_time,
+            }
+            if return_report:
+                return contours, report
+            return contours
+
+    # Stages that do not depend on the detail level only run once
+    pipeline = ExtractionPipeline(cv_image, mode=mode)
+    pipeline.raw_contours(new_dimensions)
+
+    results: dict[float, list] = {}
+    durations: dict[float, float] = {}
+
+    def extract(levels: list[float]) -> None:
+        # Extracts contours at every new detail level
+        levels = [level for level in levels if level not in results]
+        if search_workers > 1 and len(levels) > 1:
+            with ThreadPoolExecutor(max_workers=search_workers) as pool:
+                contour_lists = pool.map(
+                    lambda level: pipeline.run(
+                        new_dimensions, level, smoothing_workers=1
+                    ),
+                    levels
+                )
+                results.update(zip(levels, contour_lists))
+        else:
+            for level in levels:
+                results[level] = pipeline.run(new_dimensions, level)
+
+    def drawing_time(level: float) -> float:
+        if level not in durations:
+            durations[level] = estimate_duration(results[level])
+        return durations[level]
+
+    def count_error(level: float) -> float:
+        # How far the contour count (or drawing time) is out of bounds:
+        # negative if too few, positive if too many and 0 if within bounds.
+        if target_duration is not None:
+            duration = drawing_time(level)
+            shortest = target_duration * (1 - duration_tolerance)
+            if duration > target_duration:
+                return duration - target_duration
+            return min(duration - shortest, 0.0)
+        count = len(results[level])
+        if count < min_contour_count:
+            return count - min_contour_count
+        if count > max_contour_count:
+            return count - max_contour_count
+        return 0
+
+    initial_level = float(calculate_image_detail_level(cv_image, 100, 400))
+    extract([initial_level])
+
+    # Bracket the bounds between the initial level and an extremity
+    bracket = None
+    if count_error(initial_level) != 0:
+        extremities = [1.0, 0.0]
+        if search_workers > 1:
+            extract(extremities)
+        for extremity in extremities:
+            extract([extremity])
+            if count_error(extremity) == 0:
+                break
+            if count_error(extremity) * count_error(initial_level) < 0:
+                bracket = sorted((initial_level, extremity))
+                break
+
+    # Narrow the bracket, each round splits it at evenly spaced levels
+    while bracket is not None and bracket[1] - bracket[0] > step:
+        low, high = bracket
+        candidate_count = max(1, search_workers)
+        candidates = [
+            low + (high - low) * (i + 1) / (candidate_count + 1)
+            for i in range(candidate_count)
+        ]
+        extract(candidates)
+        bounded = "contours" if target_duration is None else "drawing time"
+        print(f"Number of {bounded} is out of bounds. Refining between "
+              f"detail levels {low:.3f} and {high:.3f}")
 
-        # Update to the new detail level and recalculate contours
-        # in the next loop iteration
-        detail_level = new_detail_level
-        print(f"Number of countours is out of bounds: {len(contours)}.\n"
-              f"Refining with new detail level: {detail_level:.2f}")
+        levels = [low, *candidates, high]
+        if any(count_error(level) == 0 for level in levels):
+            break
+        bracket = next(
+            [a, b] for a, b in zip(levels, levels[1:])
+            if count_error(a) * count_error(b) < 0
+        )
 
-    contours = np.array(contours, dtype=object)
+    # Closest to being within bounds (drawings that fit the target time
+    # first), then closest to the initial level
+    detail_level = min(
+        results,
+        key=lambda level: (
+            target_duration is not None and count_error(level) > 0,
+            abs(count_error(level)),
+            abs(level - initial_level)
+        )
+    )
+    contours = results[detail_level]
+
+    report = {
+        "detail_level": detail_level,
+        "contour_count": len(contours),
+        "drawing_time": (
+            None if target_duration is None else drawing_time(detail_level)
+        ),
+        "extractions": len(results),
+        "wall_time": time.perf_counter() - start_time,
+    }
+    print(f"Refined to {report['contour_count']} contours at detail level "
+          f"{detail_level:.3f} in {report['extractions']} extraction(s), "
+          f"{report['wall_time'] * 1000:.0f} ms")
+    if report["drawing_time"] is not None:
+        print(f"Estimated drawing time {report['drawing_time']:.0f} s "
+              f"(target {target_duration:.0f} s)")
+
+    if cache is not None:
+        extras = {"detail_level": detail_level}
+        if report["drawing_time"] is not None:
+            extras["drawing_time"] = report["drawing_time"]
+        cache.put(key, contours, **extras)
+
+    if return_report:
+        return contours, report
     return contours
 
 
@@ -296,9 +1404,9 @@ def calculate_image_detail_level(
         min_variance=0,
         max_variance=1_000) -> float:
     """Get the detail level of a given image by calculating
-    laplacian variance. Max ~50,000"""
-    laplacian = cv2.Laplacian(cv_image, cv2.CV_64F)
-    variance = laplacian.var()
+    laplacian variance. Max ~50,000. Images larger than ANALYSIS_MAX_SIDE
+    are measured on a downsampled copy."""
+    variance = _laplacian_variance(_analysis_image(cv_image))
     print(f"Variance: {variance}")
 
     # Normalize the variance between 0 and 1
@@ -309,6 +1417,42 @@ def calculate_image_detail_level(
     return normalized_var
 
 
+def _analysis_image(cv_image, max_side: int = ANALYSIS_MAX_SIDE):
+    # The image, or a copy downsampled by a whole factor if it is at least
+    # twice max_side. Resampling by a fractional factor blurs the image and
+    # changes its Laplacian variance far more than the size change.
+    factor = max(cv_image.shape[:2]) // max_side
+    if factor < 2:
+        return cv_image
+    height, width = cv_image.shape[:2]
+    new_size = (max(1, width // factor), max(1, height // factor))
+    return cv2.resize(cv_image, new_size, interpolation=cv2.INTER_AREA)
+
+
+def _laplacian_variance(
+        cv_image,
+        band_rows: int = LAPLACIAN_BAND_ROWS) -> float:
+    # Variance of the image's Laplacian, computed in float32 a band of rows
+    # at a time so the whole Laplacian is never held in memory. Each band is
+    # computed with a row of the image either side of it so the result is
+    # the same as for the whole image.
+    height = cv_image.shape[0]
+    total = 0.0
+    total_sq = 0.0
+    for top in range(0, height, band_rows):
+        bottom = min(top + band_rows, height)
+        halo_top, halo_bottom = max(top - 1, 0), min(bottom + 1, height)
+        laplacian = cv2.Laplacian(
+            cv_image[halo_top:halo_bottom], cv2.CV_32F
+        )[top - halo_top:bottom - halo_top]
+        total += float(laplacian.sum(dtype=np.float64))
+        total_sq += float(np.square(laplacian, dtype=np.float64).sum())
+
+    count = cv_image.size
+    mean = total / count
+    return max(total_sq / count - mean ** 2, 0.0)
+
+
 def _max_rect_from_semi(
         width: float,
         height: float,
@@ -320,51 +1464,119 @@ def _max_rect_from_semi(
     return w, h
 
 
-def _perpendicular_distance(point, line_start, line_end):
-    # Function for calculating the perpendicular distance from a
-    # point to a line.
-    line_start = np.array(line_start)
-    line_end = np.array(line_end)
-    point = np.array(point)
+def _perpendicular_distances(points, line_starts, line_ends):
+    # Perpendicular distances from each point to its corresponding line.
+    # All arguments are (n, 2) arrays. The operations are ordered the same
+    # way as the original scalar formula so results are bit-identical.
+    px, py = points[:, 0], points[:, 1]
+    sx, sy = line_starts[:, 0], line_starts[:, 1]
+    ex, ey = line_ends[:, 0], line_ends[:, 1]
 
-    num = abs(
-        (line_end[1] - line_start[1]) * point[0]
-        - (line_end[0] - line_start[0]) * point[1]
-        + line_end[0] * line_start[1]
-        - line_end[1] * line_start[0]
+    num = np.abs(
+        (ey - sy) * px
+        - (ex - sx) * py
+        + ex * sy
+        - ey * sx
     )
-
-    den = np.sqrt(
-        (line_end[1] - line_start[1]) ** 2
-        + (line_end[0] - line_start[0]) ** 2
+    den = np.sqrt((ey - sy) ** 2 + (ex - sx) ** 2)
+
+    # Avoid division by zero, a zero length line has a distance of 0
+    distances = np.zeros_like(num)
+    np.divide(num, den, out=distances, where=den != 0)
+    return distances
+
+
+def _chord_distances(points, chord_starts, chord_ends):
+    # Distances from each point to its corresponding chord (line segment),
+    # in any number of dimensions. All arguments are (n, d) arrays.
+    chords = chord_ends - chord_starts
+    chord_lengths_sq = np.einsum("ij,ij->i", chords, chords)
+    offsets = points - chord_starts
+    along = np.zeros(len(points))
+    np.divide(
+        np.einsum("ij,ij->i", offsets, chords), chord_lengths_sq,
+        out=along, where=chord_lengths_sq != 0
     )
-
-    return num / den if den != 0 else 0  # Avoid division by zero
+    along = np.clip(along, 0.0, 1.0)
+    return np.linalg.norm(offsets - along[:, None] * chords, axis=1)
 
 
-def _rdp(points, epsilon=1.0):
-    # Simplify contour using the Ramer-Douglas-Peucker algorithm.
-    if len(points) < 3:  # No need to simplify if there are only two points
-        return points
+def _rdp_batch(
+        contours,
+        epsilon=1.0,
+        distances=_perpendicular_distances) -> list:
+    # Simplify a batch of contours using the Ramer-Douglas-Peucker algorithm.
+    # Every contour is packed into one flat buffer and all of the pending
+    # index ranges (segments) are processed together, one level of the
+    # recursion per NumPy pass, using an explicit stack instead of recursion.
+    # Contours are 2D unless another distance function is given.
+    lengths = np.array([len(c) for c in contours], dtype=np.int64)
+    simplify = lengths >= 3  # No need to simplify if there are only two points
+    if not simplify.any():
+        return list(contours)
+
+    flat = np.concatenate(
+        [np.asarray(c, dtype=np.float64).reshape(len(c), -1)
+         for c, s in zip(contours, simplify) if s]
+    )
+    ends = np.cumsum(lengths[simplify])
+    starts = ends - lengths[simplify]
+
+    # The first and last points of every contour are always kept
+    keep = np.zeros(len(flat), dtype=bool)
+    keep[starts] = True
+    keep[ends - 1] = True
+
+    seg_start = starts
+    seg_end = ends - 1
+    while len(seg_start):
+        # Gather the interior point indices of every segment
+        counts = seg_end - seg_start - 1
+        seg_ids = np.repeat(np.arange(len(seg_start)), counts)
+        group_starts = np.cumsum(counts) - counts
+        point_idx = (
+            np.arange(counts.sum()) - group_starts[seg_ids]
+            + seg_start[seg_ids] + 1
+        )
 
-    def rdp_recursive(points, epsilon):
-        if len(points) < 3:
-            return points
+        point_distances = distances(
+            flat[point_idx],
+            flat[seg_start[seg_ids]],
+            flat[seg_end[seg_ids]]
+        )
 
-        distances = [
-            _perpendicular_distance(point, points[0], points[-1])
-            for point in points[1:-1]
-        ]
-        max_distance = max(distances, default=0)  # Get max distance safely
-        index = distances.index(max_distance) + 1  # Shift index due to slicing
+        # Max distance of each segment and the first index it occurs at
+        max_distances = np.maximum.reduceat(point_distances, group_starts)
+        is_max = np.flatnonzero(point_distances == max_distances[seg_ids])
+        _, first = np.unique(seg_ids[is_max], return_index=True)
+        split_idx = point_idx[is_max[first]]
+
+        # Split the segments that are not within epsilon at their max point
+        split = max_distances > epsilon
+        split_idx = split_idx[split]
+        keep[split_idx] = True
+
+        new_start = np.concatenate((seg_start[split], split_idx))
+        new_end = np.concatenate((split_idx, seg_end[split]))
+        has_interior = new_end - new_start >= 2
+        seg_start = new_start[has_interior]
+        seg_end = new_end[has_interior]
+
+    simplified = []
+    flat_index = 0
+    for contour, length, should_simplify in zip(contours, lengths, simplify):
+        if not should_simplify:
+            simplified.append(contour)
+            continue
+        contour_keep = keep[flat_index:flat_index + length]
+        simplified.append(np.asarray(contour)[contour_keep])
+        flat_index += length
+    return simplified
 
-        if max_distance > epsilon:
-            left = rdp_recursive(points[:index + 1], epsilon)
-            right = rdp_recursive(points[index:], epsilon)
-            return left[:-1] + right
-        return [points[0], points[-1]]
 
-    return np.array(rdp_recursive(list(points), epsilon))
+def _rdp(points, epsilon=1.0):
+    # Simplify contour using the Ramer-Douglas-Peucker algorithm.
+    return _rdp_batch([points], epsilon)[0]
 
 
 def _interpolate_threshold(
@@ -392,32 +1604,98 @@ def _interpolate_value(
     return threshold[0] + (threshold[1] - threshold[0]) * k
 
 
-def _calculate_smooth_pwr(contour):
-    # Calculates the smoothing exponent.
-    # Returns 1 if mostly straight, 3 if curvy.
-
-    if len(contour) < 5:
-        return 1  # Too small, assume linear
+def contour_features(contours, linearity_epsilon: float = 2.0) -> dict:
+    """
+    Measures every contour in one batched pass. Returns a table (dict of
+    arrays with one row per contour) of:
+        point_count: number of points
+        length: polyline length
+        simplified_length: length after RDP with linearity_epsilon
+        linearity: simplified_length / length, closer to 1 = straighter
+        curvature: strength of a quadratic fit of y along the contour
+        bbox: (min x, min y, max x, max y)
+        spline_degree: 1 for mostly straight contours, 3 for curvy ones
+    """
+    contours = ContourSet.from_contours(contours)
+    counts = contours.lengths
+    owners = np.repeat(np.arange(len(contours)), counts)
+    points = contours.points.astype(np.float64)
 
-    # Measure linearity (RDP simplification)
-    simplified_contour = _rdp(contour, epsilon=2.0)
-    original_length = np.sum(np.linalg.norm(np.diff(contour, axis=0), axis=1))
-    simplified_length = np.sum(
-        np.linalg.norm(np.diff(simplified_contour, axis=0), axis=1)
+    simplified = ContourSet.from_contours(
+        _rdp_batch(list(contours), epsilon=linearity_epsilon)
+    )
+    length = _polyline_lengths(points, owners, len(contours))
+    simplified_length = _polyline_lengths(
+        simplified.points.astype(np.float64),
+        np.repeat(np.arange(len(simplified)), simplified.lengths),
+        len(contours)
+    )
+    linearity = np.ones(len(contours))
+    np.divide(simplified_length, length, out=linearity, where=length > 0)
+
+    bbox = np.full((len(contours), 4), np.nan)
+    non_empty = counts > 0
+    starts = contours.offsets[:-1][non_empty]
+    bbox[non_empty, :2] = np.minimum.reduceat(points, starts)
+    bbox[non_empty, 2:] = np.maximum.reduceat(points, starts)
+
+    curvature = _quadratic_curvatures(points[:, 1], owners, counts)
+
+    # Mostly straight contours use linear smoothing, others cubic
+    is_straight = (linearity > 0.95) & (curvature < 0.005)
+    spline_degree = np.where((counts < 5) | is_straight, 1, 3)
+
+    return {
+        "point_count": counts,
+        "length": length,
+        "simplified_length": simplified_length,
+        "linearity": linearity,
+        "curvature": curvature,
+        "bbox": bbox,
+        "spline_degree": spline_degree,
+    }
+
+
+def _polyline_lengths(points, owners, contour_count: int):
+    # Length of every contour in a flat (n, 2) point buffer where owners
+    # gives the contour of each point.
+    segment_lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+    same_contour = owners[1:] == owners[:-1]
+    return np.bincount(
+        owners[1:][same_contour],
+        weights=segment_lengths[same_contour],
+        minlength=contour_count
     )
 
-    # Closer to 1 = More straight
-    linearity_score = simplified_length / original_length
-
-    # Measure curvature
-    x = np.linspace(0, 1, len(contour))
-    y = contour[:, 1]
-    poly_coeffs = np.polyfit(x, y, 2)  # Quadratic fit (ax^2 + bx + c)
-    curvature = abs(poly_coeffs[0])  # The 'a' coeff represents curve strength
 
-    if linearity_score > 0.95 and curvature < 0.005:
-        return 1  # Mostly straight, use linear smoothing
-    return 3  # Mostly curved, use cubic smoothing
+def _quadratic_curvatures(values, owners, counts):
+    # Absolute leading coefficient of a least squares quadratic fit of each
+    # contour's values against evenly spaced x in [0, 1] (what np.polyfit
+    # of degree 2 gives), solved as one batch of 3x3 normal equations.
+    # Contours with fewer than 3 points have a curvature of 0.
+    curvatures = np.zeros(len(counts))
+    fit = counts >= 3
+    if not fit.any():
+        return curvatures
+
+    starts = np.cumsum(counts) - counts
+    positions = np.arange(len(values)) - np.repeat(starts, counts)
+    x = positions / np.maximum(np.repeat(counts, counts) - 1, 1)
+
+    def sums(weights):
+        return np.bincount(owners, weights=weights, minlength=len(counts))
+
+    x_powers = [sums(x ** k) for k in range(5)]
+    gram = np.stack([
+        np.stack([x_powers[4 - row - col] for col in range(3)], axis=-1)
+        for row in range(3)
+    ], axis=-2)
+    moments = np.stack(
+        [sums(x ** (2 - row) * values) for row in range(3)], axis=-1
+    )
+    coeffs = np.linalg.solve(gram[fit], moments[fit][..., None])[..., 0]
+    curvatures[fit] = np.abs(coeffs[:, 0])
+    return curvatures
 
 
 def _dedupe_contour(contour):
@@ -433,22 +1711,80 @@ def _get_smoothed_contours(
         min_cont_points_smooth: int,
         linscape_threshold: tuple[float, float],
         epsilon: float,
-        smoothness: float):
+        smoothness: float,
+        workers: int | None = None,
+        spline_degrees=None,
+        closed=None):
+    # Spline degrees of the contours are taken from spline_degrees (the
+    # spline_degree column of their contour_features) if given, otherwise
+    # they are measured. The smoothed contours keep the closed flags.
+
+    if workers is None:
+        workers = SMOOTHING_WORKERS
+
+    # Pack the contours into one (n, 2) buffer and ignore small contours
+    contours = ContourSet.from_contours(contours, closed)
+    kept = contours.lengths > min_cont_points_ignore
+    contours = contours.select(kept)
+    if spline_degrees is None:
+        spline_degrees = contour_features(contours)["spline_degree"]
+    else:
+        spline_degrees = np.asarray(spline_degrees)[kept]
 
-    smoothed_contours = []
-    for contour in contours:
-        # Flatten the contour into a 2D array (n, 2)
-        contour = contour.squeeze()
+    smooth_args = (
+        min_cont_points_smooth, linscape_threshold, epsilon, smoothness
+    )
+
+    # Small inputs are smoothed serially as starting up the worker
+    # processes would cost more than it saves
+    if workers <= 1 or len(contours.points) < PARALLEL_SMOOTHING_MIN_POINTS:
+        return ContourSet.from_contours(
+            _smooth_contour_batch(
+                list(contours), spline_degrees.tolist(), *smooth_args
+            ),
+            contours.closed
+        )
+
+    batches = _balanced_batches(contours, workers)
+    pool = _get_smoothing_pool(workers)
+    futures = [
+        pool.submit(
+            _smooth_contour_batch,
+            [contours[i] for i in batch],
+            spline_degrees[batch].tolist(),
+            *smooth_args
+        )
+        for batch in batches
+    ]
 
-        if len(contour) <= min_cont_points_ignore:
-            continue  # Ignore small contours
+    # Put each smoothed contour back at its original index so the output
+    # order is the same as a serial run
+    smoothed_contours = [None] * len(contours)
+    for batch, future in zip(batches, futures):
+        for i, smoothed_contour in zip(batch, future.result()):
+            smoothed_contours[i] = smoothed_contour
+    return ContourSet.from_contours(smoothed_contours, contours.closed)
 
-        # Simplify the contour using RDP
-        simplified_contour = _rdp(contour, epsilon=epsilon)
 
+def _smooth_contour_batch(
+        contours,
+        spline_degrees: list[int],
+        min_cont_points_smooth: int,
+        linscape_threshold: tuple[float, float],
+        epsilon: float,
+        smoothness: float):
+    # Simplifies and smooths a batch of (n, 2) contours with the given
+    # spline degrees. Runs in a worker process when smoothing in parallel,
+    # so it must stay module level.
+
+    # Simplify all of the contours using RDP in one batch
+    simplified_contours = _rdp_batch(contours, epsilon=epsilon)
+
+    smoothed_contours = []
+    for simplified_contour, smooth_pwr in zip(
+            simplified_contours, spline_degrees):
         # Smoothing exponent is either 1 or 3. Linear for straighter contours,
         # cubic for curvier contours.
-        smooth_pwr = _calculate_smooth_pwr(contour)
 
         # Apply B-spline for smoothing if the contour has enough points
         if len(simplified_contour) >= min_cont_points_smooth:
@@ -469,6 +1805,35 @@ def _get_smoothed_contours(
     return smoothed_contours
 
 
+def _balanced_batches(contours, batch_count: int) -> list[list[int]]:
+    # Splits contour indices into batches with roughly equal point counts.
+    # Largest contours are placed first, each into the lightest batch.
+    # Indices within each batch are kept in ascending order.
+    batches: list[list[int]] = [[] for _ in range(batch_count)]
+    loads = [0] * batch_count
+    for i in sorted(range(len(contours)), key=lambda i: -len(contours[i])):
+        lightest = loads.index(min(loads))
+        batches[lightest].append(i)
+        loads[lightest] += len(contours[i])
+    return [sorted(batch) for batch in batches if batch]
+
+
+_smoothing_pool: ProcessPoolExecutor | None = None
+_smoothing_pool_workers = 0
+
+
+def _get_smoothing_pool(workers: int) -> ProcessPoolExecutor:
+    # Returns a worker process pool, reusing the previous one if it has the
+    # same number of workers (refinement smooths contours many times).
+    global _smoothing_pool, _smoothing_pool_workers  # pylint: disable=global-statement
+    if _smoothing_pool is None or _smoothing_pool_workers != workers:
+        if _smoothing_pool is not None:
+            _smoothing_pool.shutdown()
+        _smoothing_pool = ProcessPoolExecutor(max_workers=workers)
+        _smoothing_pool_workers = workers
+    return _smoothing_pool
+
+
 def _normalized_histogram_contrast(cv_image) -> float:
     # Calculate and return a contrast value between 0 and 1 using
     # histogram method.
@@ -0,0 +1,59 @@
+"""
+Suppresses image noise before edge detection.
+
+JPEG artefacts, paper texture and speckle make Canny trace many tiny edge
+fragments, which become raw contours that are deduped, counted and then
+thrown away for being too short, or smoothed into wiggles. The grayscale
+image is smoothed with an edge-preserving bilateral filter and small light
+and dark specks are removed with a morphological opening and closing.
+Edge components too small to become a drawn contour are then removed from
+the edge map.
+"""
+
+import cv2
+import numpy as np
+
+
+# Default noise suppression: bilateral filter (diameter px, color sigma,
+# space sigma px) or None, morphological opening and closing kernel size
+# (px, 0 for none), and the fewest pixels an edge component must have (0
+# for none). None of it is applied by default, so the quality preset
+# traces every edge Canny finds.
+NOISE_SUPPRESSION = {
+    "bilateral": None,
+    "morphology": 0,
+    "min_edge_pixels": 0,
+}
+
+
+def suppress_noise(
+        gray_image,
+        bilateral: tuple[int, float, float] | None = None,
+        morphology: int = 0):
+    """Grayscale image smoothed with a bilateral filter, if its (diameter,
+    color sigma, space sigma) are given, then opened and closed with an
+    elliptical kernel of the morphology size, if it is more than 1."""
+    if bilateral is not None:
+        gray_image = cv2.bilateralFilter(gray_image, *bilateral)
+    if morphology > 1:
+        kernel = cv2.getStructuringElement(
+            cv2.MORPH_ELLIPSE, (morphology, morphology)
+        )
+        gray_image = cv2.morphologyEx(gray_image, cv2.MORPH_OPEN, kernel)
+        gray_image = cv2.morphologyEx(gray_image, cv2.MORPH_CLOSE, kernel)
+    return gray_image
+
+
+def remove_small_edges(edges, min_pixels: int):
+    """Edge map without the 8-connected edge components of fewer than
+    min_pixels pixels."""
+    if min_pixels <= 1:
+        return edges
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(
+        edges, connectivity=8
+    )
+    keep = stats[:, cv2.CC_STAT_AREA] >= min_pixels
+    keep[0] = False  # Background
+    if keep[1:count].all():
+        return edges
+    return np.where(keep[labels], edges, 0).astype(np.uint8)
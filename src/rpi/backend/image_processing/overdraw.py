@@ -0,0 +1,183 @@
+"""
+Trims the parts of strokes that retrace lines the pen has already drawn.
+
+Strokes are drawn in order onto a coverage grid a few cells per pen width.
+Each stroke is sampled every cell along its length and checked a piece at
+a time against the ink already on the grid, then its uncovered samples are
+stamped with the pen's footprint. Runs of samples whose footprint is
+already mostly inked are cut out of the stroke.
+"""
+
+import numpy as np
+
+from src.rpi.backend.constants import PEN_WIDTH
+
+
+# Coverage grid cells across the pen's width
+OVERDRAW_CELLS_PER_WIDTH = 4
+
+# Fraction of a point's pen footprint that must already be inked for it to
+# be trimmed
+OVERDRAW_COVERAGE = 0.8
+
+# Covered runs inside a stroke shorter than this (mm) are still drawn, as
+# lifting the pen over them takes longer than drawing them. This is about
+# what image_processing.pen_lift_gap gives for the arm in constants.py,
+# which callers planning a drawing pass instead.
+OVERDRAW_MIN_GAP = 37.0
+
+# Strokes are checked in pieces about this long (mm). A stroke doubling
+# back over its last piece or two isn't trimmed.
+OVERDRAW_PIECE_LENGTH = 5.0
+
+
+def remove_overdraw(
+        strokes,
+        pen_width: float = PEN_WIDTH,
+        coverage: float = OVERDRAW_COVERAGE,
+        min_gap: float = OVERDRAW_MIN_GAP,
+        piece_length: float = OVERDRAW_PIECE_LENGTH,
+        return_report: bool = False):
+    """
+    Trim or drop the parts of strokes (in drawing order) that retrace ink
+    from earlier strokes, or from earlier in the same stroke. A point is
+    covered when at least `coverage` of the pen's footprint around it is
+    already inked. Covered runs at either end of a stroke are trimmed, and
+    covered runs inside a stroke are cut out if they are at least min_gap
+    long. Strokes are returned as (n, 2) arrays.
+
+    The pen-down length before and after and the number of strokes are
+    printed. If return_report is True a (strokes, report) tuple is
+    returned, where the report holds those values.
+    """
+    strokes = [np.asarray(s, dtype=float).reshape(-1, 2) for s in strokes]
+    strokes = [stroke for stroke in strokes if len(stroke)]
+
+    trimmed = []
+    if strokes:
+        cell = pen_width / OVERDRAW_CELLS_PER_WIDTH
+        footprint = _footprint(OVERDRAW_CELLS_PER_WIDTH / 2)
+        all_points = np.concatenate(strokes)
+        origin = all_points.min(axis=0) - pen_width
+        width, height = (
+            np.ceil((all_points.max(axis=0) + pen_width - origin) / cell)
+            .astype(int) + 1
+        )
+        grid = np.zeros((height, width), dtype=bool)
+
+        for stroke in strokes:
+            distances = np.concatenate(([0.0], np.cumsum(
+                np.linalg.norm(np.diff(stroke, axis=0), axis=1)
+            )))
+            samples = np.append(np.arange(0, distances[-1], cell),
+                                distances[-1])
+            cells = np.column_stack((
+                np.interp(samples, distances, stroke[:, 0]),
+                np.interp(samples, distances, stroke[:, 1]),
+            ))
+            cells = np.rint((cells - origin) / cell).astype(np.int64)
+            covered = _trace(
+                grid, cells, footprint, coverage,
+                np.searchsorted(
+                    samples, np.arange(piece_length, samples[-1],
+                                       piece_length)
+                )
+            )
+            trimmed.extend(
+                _slice_polyline(stroke, distances, samples[start],
+                                samples[end])
+                for start, end in _kept_runs(covered, samples, min_gap)
+            )
+
+    report = {
+        "pen_down_before": _pen_down_length(strokes),
+        "pen_down_after": _pen_down_length(trimmed),
+        "strokes_before": len(strokes),
+        "strokes_after": len(trimmed),
+    }
+    saved = report["pen_down_before"] - report["pen_down_after"]
+    print(f"Trimmed {saved:.0f} mm of overdraw "
+          f"({saved / max(report['pen_down_before'], 1e-9):.0%} of "
+          f"{report['pen_down_before']:.0f} mm pen-down), "
+          f"{report['strokes_before']} strokes into "
+          f"{report['strokes_after']}")
+
+    if return_report:
+        return trimmed, report
+    return trimmed
+
+
+def _footprint(radius: float):
+    # (dx, dy) cell offsets of a disc of the given radius (cells).
+    reach = int(np.floor(radius))
+    d_x, d_y = np.meshgrid(np.arange(-reach, reach + 1),
+                           np.arange(-reach, reach + 1))
+    inside = d_x ** 2 + d_y ** 2 <= radius ** 2
+    return np.column_stack((d_x[inside], d_y[inside]))
+
+
+def _trace(grid, cells, footprint, coverage: float, piece_starts):
+    # Which of a stroke's sample cells are covered, inking the grid with the
+    # uncovered ones. Each piece is checked before the piece ahead of it is
+    # inked, so a piece isn't covered by where the stroke just came from.
+    footprint_x = cells[:, 0, None] + footprint[:, 0]
+    footprint_y = cells[:, 1, None] + footprint[:, 1]
+    covered = np.zeros(len(cells), dtype=bool)
+
+    bounds = np.r_[0, piece_starts, len(cells)]
+    pending = slice(0, 0)
+    for start, end in zip(bounds, bounds[1:]):
+        piece = slice(start, end)
+        covered[piece] = (
+            grid[footprint_y[piece], footprint_x[piece]].mean(axis=1)
+            >= coverage
+        )
+        _stamp(grid, footprint_x[pending], footprint_y[pending],
+               ~covered[pending])
+        pending = piece
+    _stamp(grid, footprint_x[pending], footprint_y[pending],
+           ~covered[pending])
+    return covered
+
+
+def _stamp(grid, footprint_x, footprint_y, drawn):
+    # Inks the footprints of the drawn samples.
+    grid[footprint_y[drawn], footprint_x[drawn]] = True
+
+
+def _kept_runs(covered, samples, min_gap: float) -> list[tuple[int, int]]:
+    # (first, last) sample indices of the runs of a stroke to draw. Covered
+    # runs inside the stroke shorter than min_gap are drawn anyway.
+    edges = np.flatnonzero(np.diff(np.r_[False, covered, False]))
+    gaps = edges.reshape(-1, 2)  # [start, end) of each covered run
+    inner = (gaps[:, 0] > 0) & (gaps[:, 1] < len(covered))
+    short = samples[np.minimum(gaps[:, 1], len(covered) - 1)] - samples[
+        gaps[:, 0]] < min_gap
+    gaps = gaps[~(inner & short)]
+
+    bounds = np.r_[0, gaps.ravel(), len(covered)].reshape(-1, 2)
+    return [
+        (int(start), int(end) - 1)
+        for start, end in bounds
+        if end - start > 1 or len(covered) == 1 and end > start
+    ]
+
+
+def _slice_polyline(points, distances, start: float, end: float):
+    # The part of a polyline between two distances along it.
+    inside = (distances > start) & (distances < end)
+    return np.vstack((
+        [np.interp(start, distances, points[:, 0]),
+         np.interp(start, distances, points[:, 1])],
+        points[inside],
+        [np.interp(end, distances, points[:, 0]),
+         np.interp(end, distances, points[:, 1])],
+    ))[:1 if start == end else None]
+
+
+def _pen_down_length(strokes) -> float:
+    # Total length (mm) of the strokes.
+    return sum(
+        float(np.linalg.norm(np.diff(stroke, axis=0), axis=1).sum())
+        for stroke in strokes
+    )
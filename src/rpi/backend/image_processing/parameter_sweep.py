@@ -0,0 +1,317 @@
+"""
+Sweeps a grid of contour extraction parameters over a folder of images.
+
+Every combination of the grid's values is run on every image across worker
+processes. The contours are extracted, then stitched, ordered and trimmed
+of overdraw like the Generated Images page does, and converted to motor
+commands. The extraction time, contour and point counts, motctl size,
+estimated drawing time and fidelity of each run are written to a CSV (or
+Parquet, if the output ends in .parquet) table. The combinations on the
+Pareto front of mean extraction time, drawing time and fidelity are
+printed and written to a second table next to it.
+
+Run from the repository root, e.g.:
+    python -m src.rpi.backend.image_processing.parameter_sweep \\
+        "images/*.jpg" "images/*.png" --output data/sweep.csv
+"""
+
+import argparse
+import contextlib
+import csv
+import functools
+import glob
+import io
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from src.rpi.backend.constants import (
+    ARM_LEN_1,
+    ARM_LEN_2,
+    BASE_HEIGHT,
+    PEN_LEN,
+    PEN_UP_DISTANCE,
+)
+from src.rpi.backend.image_processing import image_processing as img_proc
+from src.rpi.backend.image_processing.overdraw import remove_overdraw
+from src.rpi.backend.image_processing.stroke_stitching import stitch_contours
+
+
+# Values swept by default. "preset" and "detail_level" (None to calculate
+# it from the image) choose the preset and detail level, any other name is
+# a setting overriding the preset's (see EXTRACTION_PRESETS).
+SWEEP_GRID = {
+    "preset": ["quality", "balanced", "draft"],
+    "detail_level": [None, 0.25, 0.75],
+    "epsilon_range": [(0.05, 0.5), (0.5, 1.5)],
+    "min_cont_pts_ignore_range": [(2, 12), (8, 24)],
+}
+
+# Drawing size (mm) and the offset of its corner from the arm's base, as on
+# the Generated Images page
+SWEEP_DIMENSIONS = (210, 210)
+SWEEP_OFFSET = (-320, -SWEEP_DIMENSIONS[0] // 2, PEN_LEN)
+
+# Drawn lines and image edges closer than this (mm) match when measuring
+# fidelity
+FIDELITY_TOLERANCE = 1.5
+
+# Columns that are minimized (or maximized, for fidelity) on the Pareto
+# front, averaged over the images
+PARETO_OBJECTIVES = {
+    "extraction_time": min,
+    "drawing_time": min,
+    "fidelity": max,
+}
+
+# Columns of a run's results, the rest are its parameters
+_RESULT_COLUMNS = (
+    "image", "extraction_time", "contours", "points", "motctl_bytes",
+    "drawing_time", "pen_down_length", "fidelity",
+)
+
+
+def sweep(
+        image_paths,
+        grid: dict | None = None,
+        workers: int | None = None) -> list[dict]:
+    """
+    Runs every combination of the grid's values (defaults to SWEEP_GRID)
+    on every image across worker processes (defaults to the CPU count).
+    Returns a row per run holding the image, the parameters and
+    extraction_time (s), contours, points, motctl_bytes, drawing_time (s),
+    pen_down_length (mm) and fidelity (0 to 1, see _fidelity).
+    """
+    grid = SWEEP_GRID if grid is None else grid
+    combinations = [
+        dict(zip(grid, values)) for values in itertools.product(*grid.values())
+    ]
+    jobs = [
+        (path, params) for params in combinations for path in image_paths
+    ]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        return [_run(path, params) for path, params in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run, *zip(*jobs)))
+
+
+def pareto_front(rows: list[dict], objectives=None) -> list[dict]:
+    """
+    Averages the objective columns (defaults to PARETO_OBJECTIVES, a dict
+    of column to min or max) of the rows over the images of each parameter
+    combination, and returns the combinations no other combination beats
+    on every objective, best fidelity first.
+    """
+    objectives = PARETO_OBJECTIVES if objectives is None else objectives
+    groups: dict[str, list[dict]] = {}
+    for row in rows:
+        params = {
+            name: value for name, value in row.items()
+            if name not in _RESULT_COLUMNS
+        }
+        groups.setdefault(json.dumps(params), []).append(row)
+
+    summaries = []
+    for key, group in groups.items():
+        summary = json.loads(key)
+        summary["images"] = len(group)
+        for column in objectives:
+            summary[column] = float(np.mean([row[column] for row in group]))
+        summaries.append(summary)
+
+    # Negate the maximized objectives so lower is better for all of them
+    scores = np.array([
+        [summary[column] * (1 if goal is min else -1)
+         for column, goal in objectives.items()]
+        for summary in summaries
+    ])
+    front = [
+        summary for summary, score in zip(summaries, scores)
+        if not np.any(
+            np.all(scores <= score, axis=1) & np.any(scores < score, axis=1)
+        )
+    ]
+    return sorted(front, key=lambda summary: -summary.get("fidelity", 0))
+
+
+def write_table(rows: list[dict], path: str) -> None:
+    """Writes rows to a CSV file, or a Parquet file (which needs pandas and
+    pyarrow) if the path ends in .parquet. Tuple values are written as
+    JSON."""
+    rows = [
+        {name: _cell(value) for name, value in row.items()} for row in rows
+    ]
+    if path.endswith(".parquet"):
+        import pandas  # pylint: disable=import-outside-toplevel
+        pandas.DataFrame(rows).to_parquet(path, index=False)
+        return
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _run(path: str, params: dict) -> dict:
+    # Extracts and plans the drawing of one image with one parameter
+    # combination, and measures it. Progress prints are silenced.
+    params = dict(params)
+    preset = params.pop("preset", "quality")
+    detail_level = params.pop("detail_level", None)
+    settings = {name: _tuples(value) for name, value in params.items()}
+
+    cv_image = _load_image(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        contours = img_proc.ExtractionPipeline(
+            cv_image, preset=preset, settings=settings
+        ).run(SWEEP_DIMENSIONS, detail_level, smoothing_workers=1)
+        extraction_time = time.perf_counter() - start
+
+        strokes = remove_overdraw(
+            img_proc.sort_contours(stitch_contours(contours)),
+            min_gap=img_proc.pen_lift_gap(
+                BASE_HEIGHT, ARM_LEN_1, ARM_LEN_2,
+                SWEEP_OFFSET, PEN_UP_DISTANCE
+            )
+        )
+        estimate = img_proc.estimate_drawing_time(
+            strokes, BASE_HEIGHT, ARM_LEN_1, ARM_LEN_2,
+            SWEEP_OFFSET, PEN_UP_DISTANCE
+        )
+
+    return {
+        "image": os.path.basename(path),
+        "preset": preset,
+        "detail_level": detail_level,
+        **params,
+        "extraction_time": extraction_time,
+        "contours": len(contours),
+        "points": sum(len(contour) for contour in contours),
+        "motctl_bytes": estimate["motctl_bytes"],
+        "drawing_time": estimate["duration"],
+        "pen_down_length": estimate["pen_down_length"],
+        "fidelity": _fidelity(strokes, _reference_edges(path)),
+    }
+
+
+@functools.lru_cache(maxsize=8)
+def _load_image(path: str):
+    # Image read once per worker process.
+    cv_image = cv2.imread(path)
+    if cv_image is None:
+        raise ValueError(f"Could not read image: '{path}'")
+    return cv_image
+
+
+@functools.lru_cache(maxsize=8)
+def _reference_edges(path: str):
+    # Canny edge map of the image at the drawing's size with the quality
+    # preset, which drawings are measured against.
+    with contextlib.redirect_stdout(io.StringIO()):
+        return img_proc.ExtractionPipeline(_load_image(path)).edges(
+            SWEEP_DIMENSIONS
+        )
+
+
+def _fidelity(strokes, edges, tolerance: float = FIDELITY_TOLERANCE):
+    # F-score of how much of the image's edges have a drawn line within the
+    # tolerance (recall) and how much of the drawing is within the
+    # tolerance of an edge (precision).
+    if not strokes or not edges.any():
+        return 0.0
+    drawing = np.full(edges.shape, 255, dtype=np.uint8)
+    cv2.polylines(
+        drawing,
+        [np.rint(stroke).astype(np.int32).reshape(-1, 1, 2)
+         for stroke in strokes],
+        False, 0
+    )
+    to_drawing = cv2.distanceTransform(drawing, cv2.DIST_L2, 3)
+    to_edges = cv2.distanceTransform(
+        np.where(edges > 0, 0, 255).astype(np.uint8), cv2.DIST_L2, 3
+    )
+    recall = float(np.mean(to_drawing[edges > 0] <= tolerance))
+    precision = float(np.mean(to_edges[drawing == 0] <= tolerance))
+    if recall + precision == 0:
+        return 0.0
+    return 2 * recall * precision / (recall + precision)
+
+
+def _tuples(value):
+    # JSON lists (from a grid file) as the tuples the settings use.
+    if isinstance(value, list):
+        return tuple(_tuples(item) for item in value)
+    if isinstance(value, dict):
+        return {name: _tuples(item) for name, item in value.items()}
+    return value
+
+
+def _cell(value):
+    # Table cell for a value, with tuples, lists and dicts as JSON.
+    if isinstance(value, (tuple, list, dict)):
+        return json.dumps(value)
+    return value
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Sweep contour extraction parameters over images."
+    )
+    parser.add_argument(
+        "patterns", nargs="+",
+        help="image paths or glob patterns, e.g. 'images/*.jpg'"
+    )
+    parser.add_argument(
+        "--grid",
+        help="JSON file of parameter names to lists of values "
+             "(defaults to SWEEP_GRID)"
+    )
+    parser.add_argument(
+        "--output", default="sweep.csv",
+        help="table to write, .csv or .parquet (default: sweep.csv)"
+    )
+    parser.add_argument(
+        "--workers", type=int,
+        help="worker processes (default: the CPU count)"
+    )
+    args = parser.parse_args()
+
+    image_paths = sorted({
+        path for pattern in args.patterns for path in glob.glob(pattern)
+    })
+    if not image_paths:
+        parser.error("no images match the given patterns")
+    grid = None
+    if args.grid:
+        with open(args.grid, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+
+    start = time.perf_counter()
+    rows = sweep(image_paths, grid=grid, workers=args.workers)
+    front = pareto_front(rows)
+    print(f"Ran {len(rows)} extractions of {len(image_paths)} image(s) in "
+          f"{time.perf_counter() - start:.1f} s")
+
+    root, extension = os.path.splitext(args.output)
+    front_path = f"{root}_pareto{extension}"
+    write_table(rows, args.output)
+    write_table(front, front_path)
+    print(f"Wrote {args.output} and the Pareto front to {front_path}:")
+    for summary in front:
+        params = ", ".join(
+            f"{name}={value}" for name, value in summary.items()
+            if name not in PARETO_OBJECTIVES and name != "images"
+        )
+        print(f"\tfidelity {summary['fidelity']:.3f}, "
+              f"extraction {summary['extraction_time'] * 1000:7.1f} ms, "
+              f"drawing {summary['drawing_time']:6.0f} s: {params}")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,191 @@
+"""
+Stitches contours whose endpoints meet into continuous pen-down strokes.
+
+Every open contour is an edge of a graph whose nodes are groups of contour
+endpoints no further than a tolerance apart. The edges are then chained
+into the fewest trails (Eulerian paths), each of which is drawn as one
+stroke without lifting the pen. Closed loops already are one stroke and
+are left as they are.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from src.rpi.backend.image_processing.contour_set import ContourSet
+
+
+# Contour endpoints joined into one stroke are at most this far apart (mm)
+STITCH_TOLERANCE = 1.0
+
+
+def stitch_contours(
+        contours,
+        tolerance: float = STITCH_TOLERANCE,
+        closed=None,
+        return_report: bool = False) -> ContourSet | tuple[ContourSet, dict]:
+    """
+    Join open contours whose endpoints coincide within the tolerance into
+    the fewest continuous strokes. Endpoints are grouped around centres
+    half the tolerance away at most, so the pen never jumps further than
+    the tolerance between two contours. Contours are closed loops where closed
+    (one bool per contour) says so, which defaults to the closed flags of a
+    ContourSet. Closed loops are kept as they are, and keep their flags in
+    the returned ContourSet of strokes.
+
+    The number of pen lifts before and after and the number avoided are
+    printed. If return_report is True a (strokes, report) tuple
+    is returned, where the report holds those values.
+    """
+    if closed is None:
+        closed = getattr(contours, "closed", None)
+    if closed is None:
+        closed = [False] * len(contours)
+    contours = [np.asarray(contour).reshape(-1, 2) for contour in contours]
+    loops = [
+        contour for contour, is_closed in zip(contours, closed)
+        if is_closed and len(contour)
+    ]
+    contours = [
+        contour for contour, is_closed in zip(contours, closed)
+        if not is_closed and len(contour)
+    ]
+    if not contours:
+        strokes = []
+    else:
+        edge_nodes = _endpoint_nodes(contours, tolerance)
+        strokes = [
+            _join_trail(contours, trail)
+            for trail in _fewest_trails(edge_nodes)
+        ]
+
+    pen_lifts_avoided = len(contours) - len(strokes)
+    report = {
+        "pen_lifts_before": len(loops) + len(contours),
+        "pen_lifts_after": len(loops) + len(strokes),
+        "pen_lifts_avoided": pen_lifts_avoided,
+    }
+    print(f"Stitched {report['pen_lifts_before']} contours into "
+          f"{report['pen_lifts_after']} strokes, avoiding "
+          f"{report['pen_lifts_avoided']} pen lift(s)")
+
+    strokes = ContourSet.from_contours(
+        loops + strokes, [True] * len(loops) + [False] * len(strokes)
+    )
+    if return_report:
+        return strokes, report
+    return strokes
+
+
+def _endpoint_nodes(contours, tolerance: float):
+    # Node ids of the (start, end) of every contour. Each endpoint not yet
+    # in a node becomes the centre of a new one, with every other such
+    # endpoint within half the tolerance of it. Grouping pairs within the
+    # tolerance transitively instead would chain endpoints into nodes far
+    # wider than the tolerance.
+    count = len(contours)
+    endpoints = np.array(
+        [contour[0] for contour in contours]
+        + [contour[-1] for contour in contours],
+        dtype=float
+    )
+    neighbours = cKDTree(endpoints).query_ball_point(
+        endpoints, tolerance / 2
+    )
+    labels = np.full(2 * count, -1, dtype=np.int64)
+    node_count = 0
+    for centre, near in enumerate(neighbours):
+        if labels[centre] >= 0:
+            continue
+        near = np.asarray(near, dtype=np.int64)
+        labels[near[labels[near] < 0]] = node_count
+        node_count += 1
+    return np.column_stack((labels[:count], labels[count:]))
+
+
+def _fewest_trails(edge_nodes) -> list[list[tuple[int, bool]]]:
+    # Splits the edges of the graph into the fewest trails. Odd degree nodes
+    # are paired up with virtual edges so every node has an even degree,
+    # an Eulerian circuit is found for each component and the circuits are
+    # cut at the virtual edges. Returns (edge, is reversed) pairs per trail.
+    edge_nodes = [tuple(map(int, nodes)) for nodes in edge_nodes]
+    real_edge_count = len(edge_nodes)
+    node_count = max(max(nodes) for nodes in edge_nodes) + 1
+
+    degrees = np.zeros(node_count, dtype=np.int64)
+    for u, v in edge_nodes:
+        degrees[u] += 1
+        degrees[v] += 1
+    odd_nodes = np.flatnonzero(degrees % 2).tolist()
+    edge_nodes += list(zip(odd_nodes[::2], odd_nodes[1::2]))
+
+    adjacency: list[list[int]] = [[] for _ in range(node_count)]
+    for edge, (u, v) in enumerate(edge_nodes):
+        adjacency[u].append(edge)
+        if u != v:
+            adjacency[v].append(edge)
+
+    used = [False] * len(edge_nodes)
+    next_edge = [0] * node_count  # Index of the next unchecked edge per node
+
+    trails = []
+    for start_node in range(node_count):
+        if next_edge[start_node] == len(adjacency[start_node]):
+            continue
+
+        # Hierholzer's algorithm. Each stack entry is a node and the edge
+        # used to reach it. Popped entries form the circuit in reverse.
+        stack = [(start_node, -1)]
+        popped = []
+        while stack:
+            node = stack[-1][0]
+            edges = adjacency[node]
+            while (next_edge[node] < len(edges)
+                   and used[edges[next_edge[node]]]):
+                next_edge[node] += 1
+            if next_edge[node] == len(edges):
+                popped.append(stack.pop())
+                continue
+            edge = edges[next_edge[node]]
+            used[edge] = True
+            u, v = edge_nodes[edge]
+            stack.append((v if u == node else u, edge))
+
+        # Edge k of the circuit goes from node k to node k + 1
+        circuit = popped[::-1]
+        circuit_edges = [
+            (edge, circuit[k][0]) for k, (_, edge) in enumerate(circuit[1:])
+        ]
+
+        # Start just after a virtual edge so no trail wraps around
+        virtual = [
+            k for k, (edge, _) in enumerate(circuit_edges)
+            if edge >= real_edge_count
+        ]
+        if virtual:
+            first = virtual[0] + 1
+            circuit_edges = circuit_edges[first:] + circuit_edges[:first]
+
+        trail: list[tuple[int, bool]] = []
+        for edge, from_node in circuit_edges:
+            if edge >= real_edge_count:
+                if trail:
+                    trails.append(trail)
+                trail = []
+            else:
+                trail.append((edge, edge_nodes[edge][0] != from_node))
+        if trail:
+            trails.append(trail)
+
+    return trails
+
+
+def _join_trail(contours, trail):
+    # Concatenates the contours of a trail into one stroke, dropping the
+    # joining point where two contours share it exactly.
+    parts = []
+    for edge, is_reversed in trail:
+        contour = contours[edge][::-1] if is_reversed else contours[edge]
+        if parts and np.array_equal(parts[-1][-1], contour[0]):
+            contour = contour[1:]
+        parts.append(contour)
+    return np.concatenate(parts)
@@ -0,0 +1,337 @@
+"""
+Tiled parallel edge detection and contour extraction for large images.
+
+The image is split into tiles that share their border row and column with
+their neighbours. Each tile's Canny edges are computed with a margin of
+extra pixels around it, so edges near the tile border match the untiled
+edge map. Only a weak edge joined to a strong edge further than the margin
+away can differ. Tiles are processed on a thread pool (OpenCV releases
+the GIL). Contours that reach an inner tile border are cut there, and
+each piece is rejoined to the piece of the neighbouring tile that carries
+the same contour on across the border.
+
+findContours traces every outline with the edge on the same side, so the
+untiled contour leaving a tile at a border point continues (possibly after
+running along the border) with a neighbour's piece that starts there,
+never one that ends there (the other side of the same edge). Pieces
+without such a neighbour are joined to the next piece of their own tile's
+contour along the border instead. Rejoined loops start where findContours
+would start tracing them, as smoothing depends on where loops start.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+# Tiles are this many pixels wide and high, plus their shared borders, and
+# edges are detected this many pixels past each side of a tile
+TILE_SIZE = 512
+TILE_MARGIN = 32
+
+
+def tile_bounds(shape, tile_size: int = TILE_SIZE) -> list:
+    """Inclusive (x0, y0, x1, y1) bounds of the tiles covering an image of
+    the given (height, width) shape. Neighbouring tiles share the row or
+    column on their common border."""
+    height, width = shape[:2]
+    xs = list(range(0, max(width - 1, 1), tile_size)) + [width - 1]
+    ys = list(range(0, max(height - 1, 1), tile_size)) + [height - 1]
+    return [
+        (x0, y0, x1, y1)
+        for y0, y1 in zip(ys, ys[1:])
+        for x0, x1 in zip(xs, xs[1:])
+    ]
+
+
+def tiled_canny(
+        gray_image,
+        thresholds,
+        tile_size: int = TILE_SIZE,
+        margin: int = TILE_MARGIN,
+        workers: int = 4):
+    """Canny edge map of a grayscale image, detected one tile at a time
+    across worker threads."""
+    height, width = gray_image.shape[:2]
+    edges = np.zeros((height, width), dtype=np.uint8)
+
+    def detect(bounds):
+        x0, y0, x1, y1 = bounds
+        top, left = max(y0 - margin, 0), max(x0 - margin, 0)
+        tile = cv2.Canny(
+            gray_image[top:min(y1 + margin + 1, height),
+                       left:min(x1 + margin + 1, width)],
+            *thresholds
+        )
+        edges[y0:y1 + 1, x0:x1 + 1] = tile[y0 - top:y1 - top + 1,
+                                           x0 - left:x1 - left + 1]
+
+    _map_tiles(detect, tile_bounds(edges.shape, tile_size), workers)
+    return edges
+
+
+def tiled_find_contours(
+        edges,
+        tile_size: int = TILE_SIZE,
+        workers: int = 4,
+        return_closed: bool = False):
+    """Contours of an edge map, traced one tile at a time across worker
+    threads, in the same format as cv2.findContours contours ((n, 1, 2)
+    int32 arrays). Contours that cross tile borders are joined back
+    together. If return_closed is True a (contours, closed) tuple is
+    returned, where closed flags the contours that are closed loops (which
+    don't repeat their first point at the end, like findContours')."""
+    height, width = edges.shape[:2]
+
+    def trace(bounds):
+        x0, y0, x1, y1 = bounds
+        contours, _ = cv2.findContours(
+            image=np.ascontiguousarray(edges[y0:y1 + 1, x0:x1 + 1]),
+            mode=cv2.RETR_LIST,
+            method=cv2.CHAIN_APPROX_NONE,
+            offset=(x0, y0)
+        )
+        if not contours:
+            return [], [], []
+
+        # Find the contours with points on an inner border in one pass
+        inner = (x0 > 0, y0 > 0, x1 < width - 1, y1 < height - 1)
+        lengths = [len(contour) for contour in contours]
+        points = np.concatenate(contours).reshape(-1, 2)
+        on_start_border, on_border = _inner_border_masks(
+            points, bounds, inner
+        )
+        corners = _corner_mask(points, lengths)
+        owners = np.repeat(np.arange(len(contours)), lengths)
+        touching = np.bincount(
+            owners, weights=on_border, minlength=len(contours)
+        )
+        on_start = np.bincount(
+            owners, weights=on_start_border, minlength=len(contours)
+        )
+        offsets = np.cumsum(lengths) - lengths
+
+        whole, on_borders, cuts = [], [], []
+        for i, contour in enumerate(contours):
+            if touching[i] == 0:
+                start = offsets[i]
+                whole.append(contour[corners[start:start + lengths[i]]])
+            elif touching[i] == lengths[i]:
+                # A contour lying on a border is only kept by the tile to
+                # its left or above, so it isn't traced twice
+                if on_start[i] < lengths[i]:
+                    on_borders.append(contour.reshape(-1, 2))
+            else:
+                start = offsets[i]
+                cuts.append(_cut_at_borders(
+                    contour.reshape(-1, 2),
+                    on_border[start:start + lengths[i]]
+                ))
+        return whole, on_borders, cuts
+
+    whole, on_borders = [], []
+    pieces, tiles, next_pieces, bridges = [], [], [], []
+    for tile, (tile_whole, tile_on_borders, cuts) in enumerate(_map_tiles(
+            trace, tile_bounds(edges.shape, tile_size), workers)):
+        whole.extend(tile_whole)
+        on_borders.extend(tile_on_borders)
+        for cut_pieces, cut_bridges in cuts:
+            first = len(pieces)
+            pieces.extend(cut_pieces)
+            bridges.extend(cut_bridges)
+            tiles.extend([tile] * len(cut_pieces))
+            next_pieces.extend(
+                first + (k + 1) % len(cut_pieces)
+                for k in range(len(cut_pieces))
+            )
+
+    # A contour lying on a border is just the edge of a contour crossing
+    # it if that one's pieces and bridges cover it
+    covered = {
+        point for points in [piece[[0, -1]] for piece in pieces] + bridges
+        for point in map(tuple, points.tolist())
+    }
+    whole += [
+        _compress_chain(contour) for contour in on_borders
+        if not all(point in covered for point in map(tuple, contour.tolist()))
+    ]
+
+    # Every contour traced whole in a tile is a findContours outline
+    closed = [True] * len(whole)
+    for chain, is_loop in _join_pieces(pieces, tiles, next_pieces, bridges):
+        if is_loop:
+            chain = np.roll(chain, -_trace_start(chain, edges), axis=0)
+        whole.append(_compress_chain(chain, is_loop))
+        closed.append(is_loop)
+
+    if return_closed:
+        return whole, closed
+    return whole
+
+
+def _map_tiles(func, bounds: list, workers: int) -> list:
+    # Runs func on every tile's bounds, across worker threads if there are
+    # more than one of each.
+    if workers <= 1 or len(bounds) <= 1:
+        return [func(tile) for tile in bounds]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, bounds))
+
+
+def _inner_border_masks(points, bounds, inner):
+    # Masks of the (n, 2) points that are on the tile's top or left inner
+    # border, and on any of its inner borders (the borders it shares with
+    # another tile).
+    x0, y0, x1, y1 = bounds
+    left, top, right, bottom = inner
+    x, y = points[:, 0], points[:, 1]
+    on_start_border = (left & (x == x0)) | (top & (y == y0))
+    on_border = on_start_border | (right & (x == x1)) | (bottom & (y == y1))
+    return on_start_border, on_border
+
+
+def _cut_at_borders(contour, on_border) -> tuple[list, list]:
+    # Cuts a closed contour at its points on the tile's inner borders into
+    # open pieces that start and end on a border. Each piece is a run of
+    # points off the border along with the border points either side of
+    # it, or a diagonal straight run between two border points. Also
+    # returns the bridge after each piece, the points along the border
+    # between its end and the start of the next piece.
+    count = len(contour)
+    first = int(np.argmax(on_border))
+    contour = np.roll(contour, -first, axis=0)
+    on_border = np.roll(on_border, -first)
+    contour = np.vstack((contour, contour[:1]))
+    on_border = np.r_[on_border, True]
+
+    border_idx = np.flatnonzero(on_border)
+    spans = [
+        (start, end) for start, end in zip(border_idx, border_idx[1:])
+        if end - start > 1 or np.all(contour[start] != contour[end])
+    ]
+    pieces = [contour[start:end + 1] for start, end in spans]
+    bridges = [
+        contour[np.arange(end + 1, next_start + count) % count]
+        if next_start <= end else contour[end + 1:next_start]
+        for (_, end), (next_start, _) in zip(spans, spans[1:] + spans[:1])
+    ]
+    return pieces, bridges
+
+
+def _join_pieces(pieces, tiles, next_pieces, bridges) -> list:
+    # Joins the pieces cut at tile borders back into (contour, is closed)
+    # pairs. Each piece continues with the first piece of another tile that
+    # starts where it ends or along the bridge after it, or failing that
+    # with the next piece of its own tile's contour (next_pieces) through
+    # the whole bridge. Chains that come back to their first piece are
+    # closed loops.
+    starts = {}
+    for piece, points in enumerate(pieces):
+        starts.setdefault(tuple(points[0].tolist()), []).append(piece)
+
+    # The points between each piece and its successor, including the
+    # successor's first point
+    successors = [-1] * len(pieces)
+    joins = [None] * len(pieces)
+    has_predecessor = [False] * len(pieces)
+    for piece, points in enumerate(pieces):
+        path = np.vstack((points[-1:], bridges[piece]))
+        for k, point in enumerate(path.tolist()):
+            other = next((
+                other for other in starts.get(tuple(point), [])
+                if tiles[other] != tiles[piece]
+                and not has_predecessor[other]
+            ), -1)
+            if other >= 0:
+                successors[piece], joins[piece] = other, path[1:k + 1]
+                has_predecessor[other] = True
+                break
+    for piece, other in enumerate(next_pieces):
+        if successors[piece] < 0 and not has_predecessor[other]:
+            successors[piece] = other
+            joins[piece] = np.vstack((bridges[piece], pieces[other][:1]))
+            has_predecessor[other] = True
+
+    visited = [False] * len(pieces)
+
+    def chain(first):
+        # Points of the chain of pieces from first, and if it is a loop
+        parts = [pieces[first]]
+        visited[first] = True
+        piece, other = first, successors[first]
+        while other >= 0 and other != first:
+            parts += [joins[piece], pieces[other][1:]]
+            visited[other] = True
+            piece, other = other, successors[other]
+        if other != first:
+            return np.concatenate(parts), False
+        # The join back to the first piece ends on its first point, which
+        # loops don't repeat
+        return np.concatenate(parts + [joins[piece]])[:-1], True
+
+    chains = [
+        chain(piece) for piece in range(len(pieces))
+        if not has_predecessor[piece]
+    ]
+    chains += [
+        chain(piece) for piece in range(len(pieces)) if not visited[piece]
+    ]
+    return chains
+
+
+def _trace_start(loop, edges) -> int:
+    # Index of the point of a loop that findContours would start tracing
+    # it from, as smoothing depends on where loops start. Outer borders
+    # (clockwise, so with a negative oriented area) start at their first
+    # pixel in raster order, and hole borders at the first one whose right
+    # neighbour is in the hole.
+    order = np.lexsort((loop[:, 0], loop[:, 1]))
+    contour = loop.reshape(-1, 1, 2).astype(np.int32)
+    if cv2.contourArea(contour, oriented=True) <= 0:
+        return int(order[0])
+    width = edges.shape[1]
+    for index in order:
+        x, y = loop[index].tolist()
+        if (x + 1 < width and not edges[y, x + 1]
+                and cv2.pointPolygonTest(contour, (x + 1, y), False) > 0):
+            return int(index)
+    return int(order[0])
+
+
+def _compress_chain(contour, closed: bool = True):
+    # Drops the points in the middle of straight runs, like
+    # cv2.CHAIN_APPROX_SIMPLE does. Tiles are traced with every pixel so a
+    # straight run through a tile isn't taken to lie on its borders.
+    # Returns an (n, 1, 2) contour.
+    contour = contour.reshape(-1, 2)
+    if closed:
+        keep = _corner_mask(contour, [len(contour)])
+    elif len(contour) < 3:
+        keep = np.ones(len(contour), dtype=bool)
+    else:
+        steps = np.diff(contour.astype(np.int64), axis=0)
+        keep = np.r_[True, ~_is_straight(steps[:-1], steps[1:]), True]
+    return contour[keep].reshape(-1, 1, 2)
+
+
+def _corner_mask(points, lengths):
+    # Which of the flat (n, 2) points of closed contours of the given
+    # lengths aren't in the middle of a straight run, including the run
+    # through a contour's last point. A contour's first point, where
+    # findContours started tracing it, is always kept.
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    counts = np.repeat(lengths, lengths)
+    index = np.arange(len(points)) - starts
+    points = points.astype(np.int64)
+    before = points - points[starts + (index - 1) % counts]
+    after = points[starts + (index + 1) % counts] - points
+    return (index == 0) | ~_is_straight(before, after)
+
+
+def _is_straight(before, after):
+    # Whether each step is in the same direction as the step before it.
+    cross = before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0]
+    dot = np.einsum("ij,ij->i", before, after)
+    return (cross == 0) & (dot > 0)
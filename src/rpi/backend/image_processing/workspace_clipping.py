@@ -0,0 +1,175 @@
+"""
+Clips strokes to the part of the paper the arm can reach.
+
+A point is in reach when its distance from the top of the arm's base is
+at most the arm's combined length (see ik.check_point_in_bounds) and at
+least the difference of its two lengths, closer than which the elbow
+can't fold. At the constant height of a pen stroke that shell is an
+annulus on the paper, so every segment of every stroke is clipped to the
+annulus at once by solving where it crosses the annulus' two circles.
+Segments are split where they leave the annulus, and the parts outside are
+dropped, so inverse kinematics is never asked for a point it can't reach.
+"""
+
+import numpy as np
+
+
+# The reach is shrunk by this much (mm) at both edges so rounding never
+# puts a point clipped onto the boundary out of reach
+WORKSPACE_MARGIN = 1e-3
+
+
+def workspace_radii(heights, base, arm1, arm2) -> tuple[float, float]:
+    """Inner and outer radius (mm) of the annulus around the arm's base
+    that is in reach at every one of the heights (z). The outer radius is
+    -1 if no point at some height is in reach."""
+    drops = [abs(z - base) for z in heights]
+    reach = arm1 + arm2 - WORKSPACE_MARGIN
+    fold = abs(arm1 - arm2) + WORKSPACE_MARGIN
+    if max(drops) > reach:
+        return 0.0, -1.0
+    outer = float(np.sqrt(reach ** 2 - max(drops) ** 2))
+    inner = float(np.sqrt(max(fold ** 2 - min(drops) ** 2, 0.0)))
+    if inner >= outer:
+        return 0.0, -1.0
+    return inner, outer
+
+
+def reachable_mask(points, inner: float, outer: float):
+    """Which (x, y) points are within the workspace annulus."""
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if outer < 0:
+        return np.zeros(len(points), dtype=bool)
+    distances_sq = np.einsum("ij,ij->i", points, points)
+    return (distances_sq <= outer ** 2) & (distances_sq >= inner ** 2)
+
+
+def clip_to_workspace(
+        strokes,
+        heights,
+        base, arm1, arm2,
+        return_report: bool = False) -> list | tuple[list, dict]:
+    """
+    Clip (x, y) strokes, in arm coordinates, to the annulus the arm can
+    reach at every one of the heights (z) they are drawn and moved at (see
+    workspace_radii). Strokes leaving the annulus are split where they
+    cross its edges, and strokes entirely outside it are dropped.
+
+    The length clipped off and the number of strokes before and after are
+    printed if anything was clipped. If return_report is True a (strokes,
+    report) tuple is returned, where the report holds those values.
+    """
+    strokes = [np.asarray(s, dtype=float).reshape(-1, 2) for s in strokes]
+    strokes = [stroke for stroke in strokes if len(stroke)]
+    inner, outer = workspace_radii(heights, base, arm1, arm2)
+
+    points = np.concatenate(strokes) if strokes else np.zeros((0, 2))
+    inside = reachable_mask(points, inner, outer)
+    if inside.all():
+        clipped = strokes
+    elif outer < 0:
+        clipped = []
+    else:
+        # Single points become a segment that doesn't move, so they have a
+        # segment to clip
+        strokes_to_clip = [
+            stroke if len(stroke) > 1 else np.vstack((stroke, stroke))
+            for stroke in strokes
+        ]
+        clipped = _clip_segments(
+            np.concatenate(strokes_to_clip),
+            np.array([len(stroke) for stroke in strokes_to_clip]),
+            inner, outer
+        )
+
+    report = {
+        "clipped_length": _total_length(strokes) - _total_length(clipped),
+        "strokes_before": len(strokes),
+        "strokes_after": len(clipped),
+    }
+    if not inside.all():
+        print(f"Clipped {report['clipped_length']:.0f} mm out of reach, "
+              f"{report['strokes_before']} strokes into "
+              f"{report['strokes_after']}")
+
+    if return_report:
+        return clipped, report
+    return clipped
+
+
+def _clip_segments(points, lengths, inner: float, outer: float) -> list:
+    # Clips every segment of the flat (n, 2) points of strokes of the given
+    # lengths to the annulus, and joins the clipped pieces back into
+    # strokes wherever consecutive ones still meet.
+    is_last = np.zeros(len(points), dtype=bool)
+    is_last[np.cumsum(lengths) - 1] = True
+    starts = points[:-1][~is_last[:-1]]
+    ends = points[1:][~is_last[:-1]]
+    is_first = np.r_[True, is_last[:-1]][:-1][~is_last[:-1]]
+    direction = ends - starts
+
+    # Keep the part of each segment (between 0 and 1) inside the outer
+    # circle, less the part inside the inner one, as up to two pieces
+    outer_in, outer_out = _disc_crossings(starts, direction, outer)
+    outer_in, outer_out = np.maximum(outer_in, 0.0), np.minimum(outer_out, 1.0)
+    if inner > 0:
+        hole_in, hole_out = _disc_crossings(starts, direction, inner)
+    else:
+        hole_in = hole_out = np.full(len(starts), np.inf)
+    t_in = np.column_stack((outer_in, np.maximum(outer_in, hole_out)))
+    t_out = np.column_stack((np.minimum(outer_out, hole_in), outer_out))
+    kept = (t_in < t_out).ravel()
+    t_in, t_out = t_in.ravel(), t_out.ravel()
+    segments = np.repeat(np.arange(len(starts)), 2)
+
+    # A piece continues the previous kept piece if that one is the whole
+    # end of the segment before and this one the whole start of its segment
+    piece_ids = np.flatnonzero(kept)
+    if not len(piece_ids):
+        return []
+    previous = np.r_[-1, piece_ids[:-1]]
+    joined = (
+        (previous >= 0)
+        & (segments[previous] == segments[piece_ids] - 1)
+        & ~is_first[segments[piece_ids]]
+        & (t_out[previous] >= 1.0)
+        & (t_in[piece_ids] <= 0.0)
+    )
+
+    # Each kept piece adds its end point, and its start point if it starts
+    # a new stroke
+    counts = np.where(joined, 1, 2)
+    ids = np.repeat(piece_ids, counts)
+    is_start = np.zeros(len(ids), dtype=bool)
+    is_start[np.cumsum(counts)[counts == 2] - 2] = True
+    t = np.where(is_start, t_in[ids], t_out[ids])
+    clipped = starts[segments[ids]] + t[:, None] * direction[segments[ids]]
+
+    return np.split(clipped, np.flatnonzero(is_start)[1:])
+
+
+def _disc_crossings(starts, direction, radius: float):
+    # Solves |start + t * direction| = radius for where each segment's line
+    # enters and leaves the disc. Lines that miss it get (inf, inf), and
+    # segments that don't move get (-inf, inf) inside it.
+    a = np.einsum("ij,ij->i", direction, direction)
+    b = 2 * np.einsum("ij,ij->i", starts, direction)
+    c = np.einsum("ij,ij->i", starts, starts) - radius ** 2
+    discriminant = b ** 2 - 4 * a * c
+    root = np.sqrt(np.maximum(discriminant, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_enter = np.where(a > 0, (-b - root) / (2 * a), -np.inf)
+        t_leave = np.where(a > 0, (-b + root) / (2 * a), np.inf)
+    crosses = np.where(a > 0, discriminant > 0, c <= 0)
+    return (
+        np.where(crosses, t_enter, np.inf),
+        np.where(crosses, t_leave, np.inf),
+    )
+
+
+def _total_length(strokes) -> float:
+    # Total length (mm) of the strokes.
+    return sum(
+        float(np.linalg.norm(np.diff(stroke, axis=0), axis=1).sum())
+        for stroke in strokes
+    )
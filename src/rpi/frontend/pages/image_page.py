@@ -14,8 +14,17 @@ from src.rpi.frontend.pages.page import Page
 from src.rpi.backend.image_generation.image_generator import generate_images
 from src.rpi.backend.image_generation.bing_token_retriever import get_token
 from src.rpi.backend.image_processing import image_processing as img_proc
+from src.rpi.backend.image_processing.contour_cache import ContourCache
+from src.rpi.backend.image_processing.contour_ordering import (
+    refine_contour_order
+)
+from src.rpi.backend.image_processing.stroke_stitching import stitch_contours
+from src.rpi.backend.image_processing.overdraw import remove_overdraw
 from src.rpi.backend.constants import (
     DETAIL_LEVEL_ADAPT,
+    DRAWING_TIME_TARGET,
+    EXTRACTION_MODE,
+    ORDER_REFINE_TIME_BUDGET,
     CONTOURS_COUNT_MIN,
     CONTOURS_COUNT_MAX,
     ANGLES_FILE_PATH,
@@ -45,6 +54,9 @@ class ImagePage(Page):
         self._image_surfaces: list[Surface] = []
         self._image_preview_index = 0
 
+        # Contours extracted from previous images are reused across restarts
+        self._contour_cache = ContourCache()
+
         # Callback to the voice page for getting the final prompt
         self._get_prompt_callback = get_prompt_callback
 
@@ -104,14 +116,22 @@ class ImagePage(Page):
         #current_image = cv2.imread("images/harry.png")
 
         img_width, img_height = 210, 210  # A4 paper width
+        offset = (-320, -img_width // 2, PEN_LEN)  # xyz
 
-        # Iteratively extract and refine contours from the image
+        # Iteratively extract and refine contours from the image, to a
+        # drawing time if there is a target
         contours = img_proc.extract_and_refine_contour_count(
             current_image,
             DETAIL_LEVEL_ADAPT,
             CONTOURS_COUNT_MIN,
             CONTOURS_COUNT_MAX,
-            (img_width, img_height)
+            (img_width, img_height),
+            cache=self._contour_cache,
+            mode=EXTRACTION_MODE,
+            target_duration=DRAWING_TIME_TARGET,
+            estimate_duration=img_proc.drawing_time_estimator(
+                BASE_HEIGHT, ARM_LEN_1, ARM_LEN_2, offset, PEN_UP_DISTANCE
+            )
         )
         """
         contours = img_proc.test_extract_contours(current_image,
@@ -128,14 +148,31 @@ class ImagePage(Page):
             if cv2.waitKey(1) == ord('q'):
                 break
 
-        # Sort the contours to reduce pen movement distances
-        #contours = img_proc.sort_contours(contours)
+        # Join contours that meet into continuous strokes to lift the pen
+        # less often
+        contours = stitch_contours(contours)
+
+        # Sort the contours to reduce pen movement distances, starting
+        # closed loops wherever is nearest
+        contours = img_proc.sort_contours(contours, closed=contours.closed)
+        contours = refine_contour_order(
+            contours, time_budget=ORDER_REFINE_TIME_BUDGET
+        )
+
+        # Trim the parts of strokes that retrace lines already drawn, where
+        # lifting the pen over them is quicker than drawing them
+        contours = remove_overdraw(
+            contours,
+            min_gap=img_proc.pen_lift_gap(
+                BASE_HEIGHT, ARM_LEN_1, ARM_LEN_2, offset, PEN_UP_DISTANCE
+            )
+        )
 
         # Save the motor angles to a .motctl file
         img_proc.save_motor_angles(
             contours,
             BASE_HEIGHT, ARM_LEN_1, ARM_LEN_2,
-            offset=(-320, -img_width // 2, PEN_LEN),  # xyz
+            offset=offset,
             pen_up_offset=PEN_UP_DISTANCE,
             output_file=ANGLES_FILE_PATH
         )
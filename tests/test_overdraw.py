@@ -0,0 +1,50 @@
+import os
+
+import cv2
+import pytest
+
+from src.rpi.backend.constants import (
+    ARM_LEN_1,
+    ARM_LEN_2,
+    BASE_HEIGHT,
+    CONTOURS_COUNT_MAX,
+    CONTOURS_COUNT_MIN,
+    DETAIL_LEVEL_ADAPT,
+    PEN_UP_DISTANCE,
+)
+from src.rpi.backend.image_processing import image_processing as img_proc
+from src.rpi.backend.image_processing.overdraw import (
+    OVERDRAW_MIN_GAP,
+    remove_overdraw,
+)
+from src.rpi.backend.image_processing.parameter_sweep import SWEEP_OFFSET
+from src.rpi.backend.image_processing.stroke_stitching import stitch_contours
+
+
+IMAGES_DIR = os.path.join(os.path.dirname(__file__), "..", "images")
+
+
+def _pen_lift_gap():
+    return img_proc.pen_lift_gap(
+        BASE_HEIGHT, ARM_LEN_1, ARM_LEN_2, SWEEP_OFFSET, PEN_UP_DISTANCE
+    )
+
+
+def test_default_gap_matches_motor_model():
+    assert OVERDRAW_MIN_GAP == pytest.approx(_pen_lift_gap(), rel=0.1)
+
+
+def test_trims_retraced_lines_of_sample_image():
+    cv_image = cv2.imread(os.path.join(IMAGES_DIR, "arm_model.png"))
+    strokes = img_proc.sort_contours(stitch_contours(
+        img_proc.extract_and_refine_contour_count(
+            cv_image, DETAIL_LEVEL_ADAPT, CONTOURS_COUNT_MIN,
+            CONTOURS_COUNT_MAX, (210, 210)
+        )
+    ))
+
+    _, report = remove_overdraw(
+        strokes, min_gap=_pen_lift_gap(), return_report=True
+    )
+
+    assert report["pen_down_after"] < 0.99 * report["pen_down_before"]
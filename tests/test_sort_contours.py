@@ -0,0 +1,79 @@
+"""
+Tests that sort_contours starts the closed outlines found in an image
+wherever is nearest to the pen.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from src.rpi.backend.image_processing import image_processing as img_proc
+from src.rpi.backend.image_processing.stroke_stitching import stitch_contours
+
+
+CIRCLE_IMAGE = os.path.join(
+    os.path.dirname(__file__), "..", "images", "circle.jpg"
+)
+
+
+def _ring_image(size: int = 200):
+    # White image with a thick black ring, whose outlines are closed loops
+    image = np.full((size, size, 3), 255, dtype=np.uint8)
+    cv2.circle(image, (size // 2, size // 2), size // 3, (0, 0, 0), 12)
+    return image
+
+
+def test_pipeline_flags_outlines_closed():
+    pipeline = img_proc.ExtractionPipeline(_ring_image())
+    contours = pipeline.run((200, 200), detail_level=1.0)
+    assert len(contours)
+    assert contours.closed.all()
+
+
+def test_sort_contours_rotates_closed_outlines():
+    pipeline = img_proc.ExtractionPipeline(_ring_image())
+    contours = stitch_contours(pipeline.run((200, 200), detail_level=1.0))
+    start = np.array([100.0, 0.0])
+
+    ordered = img_proc.sort_contours(contours, start=start)
+
+    # The first loop is entered at its point nearest the pen and closed
+    first = ordered[0]
+    nearest = min(np.linalg.norm(contour - start, axis=1).min()
+                  for contour in contours)
+    assert np.isclose(np.linalg.norm(first[0] - start), nearest)
+    assert all(np.array_equal(c[0], c[-1]) for c in ordered)
+
+
+def test_sort_contours_takes_closed_flags():
+    # An open "C" and the same "C" marked closed
+    angles = np.linspace(0.3, 2 * np.pi - 0.3, 50)
+    arc = np.column_stack((np.cos(angles), np.sin(angles))) * 10
+    start = np.array([-10.0, 0.0])
+
+    open_order = img_proc.sort_contours([arc], start=start)
+    closed_order = img_proc.sort_contours([arc], start=start, closed=[True])
+
+    assert not np.array_equal(open_order[0][0], open_order[0][-1])
+    assert np.array_equal(closed_order[0][0], closed_order[0][-1])
+    assert np.linalg.norm(closed_order[0][0] - start) < 1.0
+
+
+def test_sort_contours_closes_outlines_of_sample_image():
+    pipeline = img_proc.ExtractionPipeline(cv2.imread(CIRCLE_IMAGE))
+    contours = stitch_contours(pipeline.run((300, 300), detail_level=1.0))
+
+    ordered = img_proc.sort_contours(contours)
+
+    assert len(ordered) == len(contours)
+    assert all(np.array_equal(c[0], c[-1]) for c in ordered)
+
+
+def test_sort_contours_keeps_single_point_loops():
+    dot = np.array([[5.0, 5.0]])
+    square = np.array([[0, 0], [2, 0], [2, 2], [0, 2]], dtype=float)
+
+    ordered = img_proc.sort_contours([dot, square], closed=[True, True])
+
+    assert sorted(len(contour) for contour in ordered) == [2, 5]
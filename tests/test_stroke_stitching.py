@@ -0,0 +1,36 @@
+"""
+Tests that stitching never joins contours further apart than its
+tolerance.
+"""
+
+import numpy as np
+
+from src.rpi.backend.image_processing.stroke_stitching import stitch_contours
+
+
+def test_chained_endpoints_are_not_joined_beyond_tolerance():
+    # Five contours whose starts are 0.4 mm apart in a row, so every start
+    # is within the tolerance of the next but not of the last
+    contours = [
+        np.array([[x, 0.0], [x, 10.0 + i]])
+        for i, x in enumerate([0.0, 0.4, 0.8, 1.2, 1.6])
+    ]
+
+    strokes = stitch_contours(contours, tolerance=1.0)
+
+    assert len(strokes) < len(contours)
+    for stroke in strokes:
+        jumps = np.linalg.norm(np.diff(stroke, axis=0), axis=1)
+        # Every step is either along a contour (>= 10 mm) or a join
+        assert all(jump <= 1.0 or jump >= 10.0 for jump in jumps)
+
+
+def test_closed_loops_are_left_as_they_are():
+    square = np.array([[0, 0], [10, 0], [10, 10], [0, 10]], dtype=float)
+    line = np.array([[0, 0], [-10, 0]], dtype=float)
+
+    strokes = stitch_contours([square, line], closed=[True, False])
+
+    assert len(strokes) == 2
+    assert strokes.closed.tolist() == [True, False]
+    assert np.array_equal(strokes[0], square)
@@ -0,0 +1,51 @@
+"""
+Tests that tiled contour extraction gives the same contours as untiled
+extraction.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+from src.rpi.backend.image_processing import image_processing as img_proc
+
+
+CIRCLE_IMAGE = os.path.join(
+    os.path.dirname(__file__), "..", "images", "circle.jpg"
+)
+
+
+def _contour_keys(contours):
+    # Contours as hashable tuples of their points
+    return {
+        tuple(map(tuple, np.reshape(contour, (-1, 2)).tolist()))
+        for contour in contours
+    }
+
+
+def test_tiled_raw_contours_match_untiled():
+    image = cv2.imread(CIRCLE_IMAGE)
+    untiled = img_proc.ExtractionPipeline(image)
+    for tile_size in (256, 512):
+        tiled = img_proc.ExtractionPipeline(image, tile_size=tile_size)
+        contours = tiled.raw_contours((1000, 1000))
+
+        assert (_contour_keys(contours)
+                == _contour_keys(untiled.raw_contours((1000, 1000))))
+        assert all(tiled.raw_closed((1000, 1000)))
+
+
+def test_tiled_smoothed_contours_keep_their_points():
+    image = cv2.imread(CIRCLE_IMAGE)
+    untiled = img_proc.ExtractionPipeline(image).run((1000, 1000), 1.0)
+    for tile_size in (256, 512):
+        tiled = img_proc.ExtractionPipeline(image, tile_size=tile_size).run(
+            (1000, 1000), 1.0
+        )
+
+        assert len(tiled) == len(untiled)
+        assert tiled.closed.all()
+        assert np.allclose(
+            sorted(tiled.lengths), sorted(untiled.lengths), rtol=0.05
+        )